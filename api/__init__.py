@@ -1 +1,2 @@
-from .main import get_AQ_data, get_WPR_data
\ No newline at end of file
+from .main import get_AQ_data, get_AQ_datas, get_WPR_data, get_WPR_frame, async_get_AQ_data, async_get_AQ_datas, async_get_WPR_data, async_get_WPR_frame
+from .client import get_session, close_session, get_async_client, aclose_async_client
\ No newline at end of file
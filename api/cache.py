@@ -0,0 +1,95 @@
+import json
+import zlib
+import pandas as pd
+from datetime import datetime
+from typing import Iterator, List
+from utils.config_manager import webConfig
+from utils.disk_cache import DiskCache
+
+# 原始响应缓存默认配置，config.yml中api.cache的同名配置项会覆盖这些值
+DEFAULT_CACHE_CONFIG = {
+    'enabled': True, # 是否缓存外部接口的原始响应
+    'dir': 'cache/raw', # 缓存目录
+    'max_size_mb': 1024, # 缓存目录的最大容量（MB）
+    'ttl': 600, # 时间范围未结束的响应的有效时间（秒），已结束的不过期
+    'level': 6, # zlib压缩等级
+}
+CHUNK_SIZE = 64 * 1024 # 流式读写的分块大小
+
+def get_cache_config()->dict:
+    ''' 获取原始响应缓存配置
+    :return dict
+    '''
+    config = dict(DEFAULT_CACHE_CONFIG)
+    config.update(webConfig.api.get('cache') or {})
+    return config
+
+_config = get_cache_config()
+raw_cache = DiskCache(directory=_config['dir'], max_size_mb=_config['max_size_mb'], suffix='.zz')
+
+def get_raw_cache_key(endpoint:str, stationCodes:str|List[str], startTime, endTime)->str:
+    ''' 原始响应的缓存键：接口名称、站点编码、时间范围 '''
+    if not isinstance(stationCodes, str):
+        stationCodes = ','.join(stationCodes)
+    return json.dumps([endpoint, stationCodes, str(startTime), str(endTime)])
+
+def is_window_closed(endTime)->bool:
+    ''' 请求的时间范围是否已经结束，结束后的数据不会再变化 '''
+    return pd.to_datetime(endTime) <= datetime.now()
+
+def load_raw_response(endpoint:str, stationCodes:str|List[str], startTime, endTime)->bytes|None:
+    ''' 读取缓存的原始响应，没有缓存时返回None '''
+    if not _config['enabled']:
+        return None
+    data = raw_cache.get(get_raw_cache_key(endpoint, stationCodes, startTime, endTime))
+    if data is not None:
+        return zlib.decompress(data)
+
+def save_raw_response(endpoint:str, stationCodes:str|List[str], startTime, endTime, content:bytes)->None:
+    ''' 压缩后缓存原始响应，时间范围未结束的缓存在ttl秒后过期 '''
+    if not _config['enabled']:
+        return
+    ttl = None if is_window_closed(endTime) else _config['ttl']
+    raw_cache.set(
+        get_raw_cache_key(endpoint, stationCodes, startTime, endTime),
+        zlib.compress(content, _config['level']),
+        ttl=ttl,
+    )
+
+def iter_raw_response(endpoint:str, stationCodes:str|List[str], startTime, endTime)->Iterator[bytes]|None:
+    ''' 分块解压缓存的原始响应，没有缓存时返回None '''
+    if not _config['enabled']:
+        return None
+    data = raw_cache.get(get_raw_cache_key(endpoint, stationCodes, startTime, endTime))
+    if data is not None:
+        return iter_decompress(data)
+
+def iter_decompress(data:bytes, chunk_size:int=CHUNK_SIZE)->Iterator[bytes]:
+    ''' 分块解压zlib数据 '''
+    decompressor = zlib.decompressobj()
+    for i in range(0, len(data), chunk_size):
+        chunk = decompressor.decompress(data[i:i+chunk_size])
+        if chunk:
+            yield chunk
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+class RawResponseWriter():
+    ''' 边接收边压缩原始响应，接收完毕后调用close()写入缓存 '''
+    def __init__(self, endpoint:str, stationCodes:str|List[str], startTime, endTime):
+        self.args = (endpoint, stationCodes, startTime, endTime)
+        self._compressor = zlib.compressobj(_config['level']) if _config['enabled'] else None
+        self._chunks = []
+
+    def write(self, chunk:bytes)->None:
+        if self._compressor is not None:
+            self._chunks.append(self._compressor.compress(chunk))
+
+    def close(self)->None:
+        if self._compressor is None:
+            return
+        self._chunks.append(self._compressor.flush())
+        ttl = None if is_window_closed(self.args[-1]) else _config['ttl']
+        raw_cache.set(get_raw_cache_key(*self.args), b''.join(self._chunks), ttl=ttl)
+        self._chunks = []
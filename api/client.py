@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from utils.config_manager import webConfig
+
+# 连接池默认配置，config.yml中api.client的同名配置项会覆盖这些值
+DEFAULT_CLIENT_CONFIG = {
+    'pool_connections': 10, # 连接池数量，即最多同时保持连接的host个数
+    'pool_maxsize': 10, # 每个host的最大连接数
+    'connect_timeout': 5, # 建立连接的超时时间（秒）
+    'read_timeout': 60, # 读取响应的超时时间（秒）
+    'compress': True, # 是否启用gzip压缩传输
+}
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+# httpx.AsyncClient的连接池绑定在创建它的事件循环上，因此每个事件循环各持有一个
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+
+def get_client_config()->dict:
+    ''' 获取HTTP连接池配置
+    :return dict
+    '''
+    config = dict(DEFAULT_CLIENT_CONFIG)
+    config.update(webConfig.api.get('client') or {})
+    return config
+
+def get_timeout()->tuple:
+    ''' 获取请求超时时间
+    :return tuple (连接超时, 读取超时)
+    '''
+    config = get_client_config()
+    return (config['connect_timeout'], config['read_timeout'])
+
+def get_session()->requests.Session:
+    ''' 获取模块级共享的Session，复用TCP/TLS连接（keep-alive）
+    :return requests.Session
+    '''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                config = get_client_config()
+                adapter = HTTPAdapter(
+                    pool_connections=config['pool_connections'],
+                    pool_maxsize=config['pool_maxsize'],
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Accept-Encoding'] = 'gzip, deflate' if config['compress'] else 'identity'
+                _session = session
+    return _session
+
+def close_session()->None:
+    ''' 关闭共享的Session，释放连接池 '''
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_async_client()->httpx.AsyncClient:
+    ''' 获取当前事件循环共享的AsyncClient，与get_session使用同一份连接池配置
+    - pool_maxsize对应每个连接池保持的keep-alive连接数
+    - pool_connections * pool_maxsize对应最大并发连接数
+    :return httpx.AsyncClient
+    '''
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        config = get_client_config()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config['pool_connections'] * config['pool_maxsize'],
+                max_keepalive_connections=config['pool_maxsize'],
+            ),
+            timeout=httpx.Timeout(config['read_timeout'], connect=config['connect_timeout']),
+            headers={'Accept-Encoding': 'gzip, deflate' if config['compress'] else 'identity'},
+        )
+        _async_clients[loop] = client
+    return client
+
+async def aclose_async_client()->None:
+    ''' 关闭当前事件循环的AsyncClient '''
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
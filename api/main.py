@@ -1,7 +1,18 @@
+import asyncio
+import json
+import httpx
 import requests
 import pandas as pd
-from typing import List
+from typing import Dict, List
 from utils.config_manager import webConfig
+from .client import get_session, get_timeout, get_async_client
+from .cache import load_raw_response, save_raw_response, iter_raw_response, RawResponseWriter, CHUNK_SIZE
+from .parser import ColumnParser
+
+AQ_STATION_COL = 'stationCode' # 空气质量数据中站点编码的列名
+_AQ_BATCH = {'supported': True} # 外部接口是否支持一次请求多个站点，被拒绝后不再批量请求
+# 外部接口明确拒绝批量请求的状态码，超时、5xx、限流等临时错误不在其中，只对本次请求逐个站点重试
+AQ_BATCH_REJECT_STATUS = (400, 413, 414, 422)
 
 def get_headers(params:dict={}):
     headers = {
@@ -11,13 +22,10 @@ def get_headers(params:dict={}):
     for k,v in params.items():
         headers[k] = v
     return headers
-    
-def get_WPR_data(stationCode,startTime,endTime)->dict:
-    ''' 获取风廓线雷达原始数据
-    :param stationCode: 站点编码
-    :param startTime:起始时间
-    :param endTime:结束时间
-    :return dict
+
+def get_WPR_request(stationCode,startTime,endTime)->tuple:
+    ''' 构造风廓线雷达数据请求
+    :return tuple (url, params, headers)
     '''
     api = webConfig.api.get('WPR')
     params = {
@@ -26,27 +34,13 @@ def get_WPR_data(stationCode,startTime,endTime)->dict:
         'EndTime': endTime,
         api['token']['key']:api['token']['value']
     }
-    
-    url = api['url']
-    response = requests.get(url, params=params, headers=get_headers())
-
-    # 检查响应状态码
-    if response.status_code == 200:
-        data = response.json()
-        return data
-    else:
-        print('请求失败:', response.status_code, response.text)
+    return api['url'], params, get_headers()
 
-def get_AQ_data(stationCodes:str|List[str],startTime,endTime)->pd.DataFrame:
-    ''' 获取空气质量数据
-    :param stationCode: 站点编码
-    :param startTime:起始时间
-    :param endTime:结束时间
-    :return pd.DataFrame
+def get_AQ_request(stationCodes:str|List[str],startTime,endTime)->tuple:
+    ''' 构造空气质量数据请求
+    :return tuple (url, params, headers)
     '''
     api = webConfig.api.get('AQ')
-    Headers = get_headers(api['token'])
-    url = api['url']
     params = {
         'StartDateTime':startTime,
         'EndDateTime':endTime,
@@ -55,13 +49,242 @@ def get_AQ_data(stationCodes:str|List[str],startTime,endTime)->pd.DataFrame:
         'DataType': 'station',
         'CalcRegionAqiType': '0'
     }
-    response = requests.get(url, params=params, headers=Headers)
+    return api['url'], params, get_headers(api['token'])
 
-    # 检查响应状态码
-    if response.status_code == 200:
-        data = response.json()
+def parse_WPR_response(content:bytes|None)->dict:
+    ''' 解析风廓线雷达数据响应 '''
+    if content is not None:
+        return json.loads(content)
+
+def parse_AQ_response(content:bytes|None)->pd.DataFrame:
+    ''' 解析空气质量数据响应 '''
+    if content is not None:
+        data = json.loads(content)
         # 处理返回的数据
         df = pd.DataFrame(data)
         return df
+
+def check_response(response)->bytes|None:
+    ''' 检查响应状态码，兼容requests与httpx的Response
+    :return bytes 请求成功时返回原始响应内容
+    '''
+    if response.status_code == 200:
+        return response.content
     else:
-        print('请求失败:', response.status_code, response.text)
\ No newline at end of file
+        print('请求失败:', response.status_code, response.text)
+
+def get_raw_data(endpoint:str, request:tuple, stationCodes, startTime, endTime)->bytes|None:
+    ''' 获取外部接口的原始响应，优先读取磁盘缓存
+    :param endpoint:接口名称，用于缓存键
+    :param request:(url, params, headers)
+    :return bytes
+    '''
+    content = load_raw_response(endpoint, stationCodes, startTime, endTime)
+    if content is None:
+        url, params, headers = request
+        response = get_session().get(url, params=params, headers=headers, timeout=get_timeout())
+        content = check_response(response)
+        if content is not None:
+            save_raw_response(endpoint, stationCodes, startTime, endTime, content)
+    return content
+
+async def async_get_raw_data(endpoint:str, request:tuple, stationCodes, startTime, endTime)->bytes|None:
+    ''' 获取外部接口的原始响应（异步），优先读取磁盘缓存，读写缓存在线程池中执行 '''
+    content = await asyncio.to_thread(load_raw_response, endpoint, stationCodes, startTime, endTime)
+    if content is None:
+        url, params, headers = request
+        response = await get_async_client().get(url, params=params, headers=headers)
+        content = check_response(response)
+        if content is not None:
+            await asyncio.to_thread(save_raw_response, endpoint, stationCodes, startTime, endTime, content)
+    return content
+
+def get_WPR_data(stationCode,startTime,endTime)->dict:
+    ''' 获取风廓线雷达原始数据
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :return dict
+    '''
+    request = get_WPR_request(stationCode,startTime,endTime)
+    return parse_WPR_response(get_raw_data('WPR', request, stationCode, startTime, endTime))
+
+def get_WPR_frame(stationCode,startTime,endTime,columns:Dict[str, type])->pd.DataFrame:
+    ''' 流式获取风廓线雷达数据，只保留需要的列，避免构造完整的JSON对象
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :param columns:需要的列及其类型，见ColumnParser
+    :return pd.DataFrame 请求失败时返回None
+    '''
+    parser = ColumnParser(columns)
+    chunks = iter_raw_response('WPR', stationCode, startTime, endTime)
+    if chunks is None:
+        url, params, headers = get_WPR_request(stationCode,startTime,endTime)
+        with get_session().get(url, params=params, headers=headers, timeout=get_timeout(), stream=True) as response:
+            if check_response(response) is None:
+                return None
+            writer = RawResponseWriter('WPR', stationCode, startTime, endTime)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                writer.write(chunk)
+                parser.feed(chunk)
+            frame = parser.to_frame()
+            writer.close()
+            return frame
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.to_frame()
+
+def get_AQ_data(stationCodes:str|List[str],startTime,endTime)->pd.DataFrame:
+    ''' 获取空气质量数据
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :return pd.DataFrame
+    '''
+    request = get_AQ_request(stationCodes,startTime,endTime)
+    return parse_AQ_response(get_raw_data('AQ', request, stationCodes, startTime, endTime))
+
+def is_AQ_batch_enabled(stationCodes:List[str])->bool:
+    ''' 是否一次请求所有站点的空气质量数据 '''
+    return len(stationCodes) > 1 and _AQ_BATCH['supported'] and webConfig.api.get('AQ').get('batch', True)
+
+def get_AQ_batch_data(stationCodes:List[str],startTime,endTime)->tuple:
+    ''' 一次请求所有站点的空气质量数据
+    :return tuple (pd.DataFrame|None, 是否被外部接口拒绝)；超时、网络错误、5xx等临时错误时返回(None, False)
+    '''
+    content = load_raw_response('AQ', stationCodes, startTime, endTime)
+    if content is None:
+        url, params, headers = get_AQ_request(stationCodes,startTime,endTime)
+        try:
+            response = get_session().get(url, params=params, headers=headers, timeout=get_timeout())
+        except requests.RequestException as e:
+            print('请求失败:', e)
+            return None, False
+        content = check_response(response)
+        if content is None:
+            return None, response.status_code in AQ_BATCH_REJECT_STATUS
+        save_raw_response('AQ', stationCodes, startTime, endTime, content)
+    return parse_AQ_response(content), False
+
+async def async_get_AQ_batch_data(stationCodes:List[str],startTime,endTime)->tuple:
+    ''' 一次请求所有站点的空气质量数据（异步），返回值同get_AQ_batch_data '''
+    content = await asyncio.to_thread(load_raw_response, 'AQ', stationCodes, startTime, endTime)
+    if content is None:
+        url, params, headers = get_AQ_request(stationCodes,startTime,endTime)
+        try:
+            response = await get_async_client().get(url, params=params, headers=headers)
+        except httpx.HTTPError as e:
+            print('请求失败:', e)
+            return None, False
+        content = check_response(response)
+        if content is None:
+            return None, response.status_code in AQ_BATCH_REJECT_STATUS
+        await asyncio.to_thread(save_raw_response, 'AQ', stationCodes, startTime, endTime, content)
+    return parse_AQ_response(content), False
+
+def split_AQ_data(df:pd.DataFrame|None, stationCodes:List[str], rejected:bool=False)->List[pd.DataFrame|None]|None:
+    ''' 将批量请求得到的空气质量数据按站点拆分
+    :param df:批量请求的结果
+    :param stationCodes:站点编码列表
+    :param rejected:外部接口是否明确拒绝了批量请求
+    :return List[pd.DataFrame|None] 与stationCodes顺序一致，结果中没有的站点为None；无法拆分时返回None，由调用方逐个站点请求
+
+    只有外部接口拒绝批量请求，或请求成功但结果中没有站点编码列时，才不再批量请求；临时错误只影响本次请求
+    '''
+    if df is None or len(df) == 0:
+        if rejected:
+            _AQ_BATCH['supported'] = False
+            print('空气质量接口拒绝批量请求，改为逐个站点请求')
+        return None
+    if AQ_STATION_COL not in df.columns:
+        _AQ_BATCH['supported'] = False
+        print('空气质量接口不支持批量请求，改为逐个站点请求')
+        return None
+    groups = {str(code): group.reset_index(drop=True) for code, group in df.groupby(df[AQ_STATION_COL].astype(str), sort=False)}
+    return [groups.get(str(code)) for code in stationCodes]
+
+def get_AQ_datas(stationCodes:List[str],startTime,endTime)->List[pd.DataFrame]:
+    ''' 获取多个站点的空气质量数据，优先一次请求所有站点，外部接口不支持时逐个站点请求
+    :param stationCodes: 站点编码列表
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :return List[pd.DataFrame] 与stationCodes顺序一致
+    '''
+    site_datas = None
+    if is_AQ_batch_enabled(stationCodes):
+        df, rejected = get_AQ_batch_data(list(stationCodes),startTime,endTime)
+        site_datas = split_AQ_data(df, stationCodes, rejected=rejected)
+    if site_datas is None:
+        site_datas = [None] * len(stationCodes)
+    return [
+        site_data if site_data is not None else get_AQ_data(code,startTime,endTime)
+        for code, site_data in zip(stationCodes, site_datas)
+    ]
+
+async def async_get_WPR_data(stationCode,startTime,endTime)->dict:
+    ''' 获取风廓线雷达原始数据（异步）
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :return dict
+    '''
+    request = get_WPR_request(stationCode,startTime,endTime)
+    return parse_WPR_response(await async_get_raw_data('WPR', request, stationCode, startTime, endTime))
+
+async def async_get_WPR_frame(stationCode,startTime,endTime,columns:Dict[str, type])->pd.DataFrame:
+    ''' 流式获取风廓线雷达数据（异步），只保留需要的列
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :param columns:需要的列及其类型，见ColumnParser
+    :return pd.DataFrame 请求失败时返回None
+    '''
+    parser = ColumnParser(columns)
+    chunks = await asyncio.to_thread(iter_raw_response, 'WPR', stationCode, startTime, endTime)
+    if chunks is None:
+        url, params, headers = get_WPR_request(stationCode,startTime,endTime)
+        async with get_async_client().stream('GET', url, params=params, headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                check_response(response)
+                return None
+            writer = RawResponseWriter('WPR', stationCode, startTime, endTime)
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                writer.write(chunk)
+                parser.feed(chunk)
+            frame = parser.to_frame()
+            await asyncio.to_thread(writer.close)
+            return frame
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.to_frame()
+
+async def async_get_AQ_data(stationCodes:str|List[str],startTime,endTime)->pd.DataFrame:
+    ''' 获取空气质量数据（异步）
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :return pd.DataFrame
+    '''
+    request = get_AQ_request(stationCodes,startTime,endTime)
+    return parse_AQ_response(await async_get_raw_data('AQ', request, stationCodes, startTime, endTime))
+
+async def async_get_AQ_datas(stationCodes:List[str],startTime,endTime)->List[pd.DataFrame]:
+    ''' 获取多个站点的空气质量数据（异步），优先一次请求所有站点，外部接口不支持时并发逐个站点请求
+    :param stationCodes: 站点编码列表
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :return List[pd.DataFrame] 与stationCodes顺序一致
+    '''
+    site_datas = None
+    if is_AQ_batch_enabled(stationCodes):
+        df, rejected = await async_get_AQ_batch_data(list(stationCodes),startTime,endTime)
+        site_datas = split_AQ_data(df, stationCodes, rejected=rejected)
+    if site_datas is None:
+        site_datas = [None] * len(stationCodes)
+    missing = [idx for idx, site_data in enumerate(site_datas) if site_data is None]
+    results = await asyncio.gather(*[async_get_AQ_data(stationCodes[idx],startTime,endTime) for idx in missing])
+    for idx, site_data in zip(missing, results):
+        site_datas[idx] = site_data
+    return site_datas
@@ -0,0 +1,159 @@
+import json
+import codecs
+import numpy as np
+import pandas as pd
+from array import array
+from typing import Dict
+
+WHITESPACE = ' \t\n\r'
+
+class ColumnParser():
+    ''' 流式解析形如{..., "data":[{...}, {...}], ...}的JSON响应，逐条解析数组中的对象，
+    只保留需要的字段并写入按列存放的缓冲区，不构造完整的JSON对象图
+
+    参数：
+    - columns:需要的字段及其类型，类型为float时存为float64（缺失或无法转换的值为NaN），
+      为int时所有值都是整数则存为int64，否则同float，为str时存为字符串
+    - array_key:顶层对象中存放数据数组的键
+
+    用法：
+    - 多次调用feed(chunk)传入响应的字节数据，最后调用close()得到各列数据
+    '''
+    def __init__(self, columns:Dict[str, type], array_key:str='data'):
+        self.columns = columns
+        self.array_key = array_key
+        self.extra = {} # 顶层对象中除数据数组以外的键值
+        self.count = 0 # 已解析的数据条数
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+        self._buffers = {name: array('d') if kind in (float, int) else [] for name, kind in columns.items()}
+        self._strings = {} # 重复的字符串（如时间）只保留一份
+
+    def feed(self, chunk:bytes)->None:
+        ''' 传入一段响应数据，并解析其中完整的部分 '''
+        self._buf = self._buf[self._pos:] + self._text_decoder.decode(chunk)
+        self._pos = 0
+        self._parse(final=False)
+
+    def close(self)->Dict[str, np.ndarray]:
+        ''' 结束解析
+        :return Dict[str, np.ndarray] 各列数据
+        '''
+        self._buf = self._buf[self._pos:] + self._text_decoder.decode(b'', final=True)
+        self._pos = 0
+        self._parse(final=True)
+        if self._state != 'end':
+            raise ValueError('JSON数据不完整')
+        self._buf = ''
+        return self.get_columns()
+
+    def get_columns(self)->Dict[str, np.ndarray]:
+        columns = {}
+        for name, kind in self.columns.items():
+            buffer = self._buffers[name]
+            if kind in (float, int):
+                values = np.frombuffer(buffer, dtype=np.float64) if len(buffer) else np.empty(0, dtype=np.float64)
+                if kind is int and np.isfinite(values).all() and (values == np.round(values)).all():
+                    values = values.astype(np.int64) # 整数（如高度）保持为整数
+                columns[name] = values
+            else:
+                columns[name] = np.array(buffer, dtype=object)
+        return columns
+
+    def to_frame(self)->pd.DataFrame:
+        ''' 结束解析并返回DataFrame '''
+        return pd.DataFrame(self.close())
+
+    def _decode(self, final:bool):
+        ''' 从当前位置解析一个JSON值，数据不完整时返回(None, False) '''
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None, False
+        if end == len(self._buf) and not final and isinstance(value, (int, float)):
+            return None, False # 数字可能被截断，需要更多数据
+        self._pos = end
+        return value, True
+
+    def _expect(self, ch:str, expected:str)->None:
+        if ch not in expected:
+            raise ValueError(f'JSON格式错误：位置{self._pos}处应为{expected!r}，实际为{ch!r}')
+        self._pos += 1
+
+    def _append(self, item:dict)->None:
+        for name, kind in self.columns.items():
+            value = item.get(name)
+            if kind in (float, int):
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    value = np.nan
+            elif value is not None:
+                value = self._strings.setdefault(value, value)
+            self._buffers[name].append(value)
+        self.count += 1
+
+    def _parse(self, final:bool)->None:
+        buf = self._buf
+        while True:
+            while self._pos < len(buf) and buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos >= len(buf):
+                return
+            ch = buf[self._pos]
+            match self._state:
+                case 'start':
+                    self._expect(ch, '{')
+                    self._state = 'key_or_end'
+                case 'key_or_end':
+                    if ch == '}':
+                        self._pos += 1
+                        self._state = 'end'
+                    else:
+                        self._state = 'key'
+                case 'key':
+                    key, ok = self._decode(final)
+                    if not ok:
+                        return
+                    self._key = key
+                    self._state = 'colon'
+                case 'colon':
+                    self._expect(ch, ':')
+                    self._state = 'value'
+                case 'value':
+                    if self._key == self.array_key and ch == '[':
+                        self._pos += 1
+                        self._state = 'item_or_end'
+                    else:
+                        value, ok = self._decode(final)
+                        if not ok:
+                            return
+                        self.extra[self._key] = value
+                        self._state = 'next'
+                case 'next':
+                    self._expect(ch, ',}')
+                    self._state = 'key' if ch == ',' else 'end'
+                case 'item_or_end':
+                    if ch == ']':
+                        self._pos += 1
+                        self._state = 'next'
+                    else:
+                        self._state = 'item'
+                case 'item':
+                    item, ok = self._decode(final)
+                    if not ok:
+                        return
+                    if isinstance(item, dict):
+                        self._append(item)
+                    self._state = 'item_next'
+                case 'item_next':
+                    self._expect(ch, ',]')
+                    self._state = 'item' if ch == ',' else 'next'
+                case 'end':
+                    raise ValueError(f'JSON格式错误：位置{self._pos}处有多余的数据')
@@ -1,36 +1,20 @@
 import pandas as pd
 import numpy as np
-from concurrent.futures import ProcessPoolExecutor
-from datetime import datetime
+from datetime import datetime, timedelta
 from fastapi import HTTPException
 
 import api
-from .utils import remove_over_height_data, concat_series, remain_special_layers, get_targeted_height_list
+from .utils import remove_over_height_data, concat_series, get_height_index
+from .utils import matrix_to_frame, to_json_list, pack_matrices, unpack_matrices, unpack_stack, json_columns_to_matrix, WIND_FIELD_KEYS
+from .utils import time_cols_to_minutes
+from .workers import compute_wind_fields, wind_field_pool
+from .heatmap_cache import heatmap_cache
 from .models import HeatMapData, WindFieldData
 from .schemas import WPR_DataType
 from utils.common import get_time_str,TimeStr
 from ..database.crud import *
-from ..database.database import SessionLocal
-
-def get_wpr_data_by_height_idx(wpr_data:pd.DataFrame,wpr_data_type:WPR_DataType,idx,nan=np.NAN):
-    ''' 根据by_val查找wpr的数据
-    :param wpr_data:风廓线雷达数据
-    :param idx:索引值
-    :param nan:没有找到时的替代值
-    :return pd.DataFrame
-    '''
-    result = nan
-    try:
-        result = wpr_data.loc[idx][wpr_data_type.value.col_name]
-    finally:
-        return result
-
-def get_wind_field_datas_by_height_idx(df:pd.DataFrame, item_time, height_list:pd.Series):
-    df_time = df[df['timePoint']==item_time]
-    hws_ = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.HWS, x))
-    hwd_ = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.HWD, x))
-    vws_ = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.VWS, x))
-    return hws_, hwd_, vws_
+from ..database.database import SessionLocal, AsyncSessionLocal, engine
+from ..database import async_crud
 
 def get_heapmap(station_code,start_time,end_time,drawSpeLayerArrow:bool=True)-> HeatMapData:
     ''' 获取风廓线雷达数据，并提取想要的数据
@@ -40,12 +24,8 @@ def get_heapmap(station_code,start_time,end_time,drawSpeLayerArrow:bool=True)->
     
     :return HeatMapData
     '''
-    data = api.get_WPR_data(station_code,start_time,end_time)
-    assert isinstance(data, dict)
-    
-    df = pd.DataFrame(data['data'])
-    columns = WPR_DataType.get_require_cols()
-    df = df[columns] # 只保留需要的数据
+    df = api.get_WPR_frame(station_code,start_time,end_time,WPR_DataType.get_require_dtypes()) # 只保留需要的数据
+    assert isinstance(df, pd.DataFrame)
     lst_time = list(df.groupby(WPR_DataType.TIMEPOINT.value.col_name).groups.keys())
     
     # region 保留高度列表里的数据
@@ -53,42 +33,16 @@ def get_heapmap(station_code,start_time,end_time,drawSpeLayerArrow:bool=True)->
     height_list = df0[WPR_DataType.HEIGHT.value.col_name]
     height_list = height_list.sort_values(ascending=False) # 倒序
     
-    HWS = []
-    VWS = []
-    HWD = []
-    df.set_index(WPR_DataType.HEIGHT.value.col_name, inplace=True) # 设置高度为index，后面用高度索引查找数据
-    # region 多进程读取数据
-    with ProcessPoolExecutor() as pool:
-        futures = []
-        for item_time in lst_time:
-            futures.append(pool.submit(get_wind_field_datas_by_height_idx, df, item_time, height_list))
-        for f in futures:
-            hws_, hwd_, vws_ = f.result()
-            HWS.append(hws_)
-            HWD.append(hwd_)
-            VWS.append(vws_)
-    # endregion
+    remained_mask = get_height_index(station_code, height_list).remained_mask if drawSpeLayerArrow else None
+    lst_time, matrices = compute_wind_fields(df, height_list, remained_mask)
 
     time_cols = [get_time_str(pd.to_datetime(item_time),TimeStr.HM) for item_time in lst_time]
     col_index = np.arange(0, len(time_cols))
-    HWS = concat_series(HWS, height_list, time_cols)
-    VWS = concat_series(VWS, height_list, time_cols)
-    HWD = concat_series(HWD, height_list, time_cols)
-    
-    HWS_ = HWS * 1
-    HWD_ = HWD
-    VWS_ = VWS * 20
-    if drawSpeLayerArrow:
-        targeted_height_list = get_targeted_height_list(list(height_list))
-        HWS_ = remain_special_layers(HWS_,targeted_height_list)
-        HWD_ = remain_special_layers(HWD,targeted_height_list)
-        VWS_ = remain_special_layers(VWS_,targeted_height_list)
-        
-    VWD_ = VWS_.applymap(lambda x: np.where(x != 0, 180, x))
+    frames = {key: matrix_to_frame(matrix, height_list.values, time_cols) for key, matrix in matrices.items()}
     # endregion
 
-    horizontal_wind = WindFieldData(OriginWS=HWS, WS=HWS_, WD=HWD_) # 水平风场数据
-    vertical_wind = WindFieldData(OriginWS=VWS, WS=VWS_, WD=VWD_) # 垂直风场数据
+    horizontal_wind = WindFieldData(OriginWS=frames['OriginHWS'], WS=frames['HWS'], WD=frames['HWD']) # 水平风场数据
+    vertical_wind = WindFieldData(OriginWS=frames['OriginVWS'], WS=frames['VWS'], WD=frames['VWD']) # 垂直风场数据
 
     result = HeatMapData(station_code=station_code,
         start_time=start_time, end_time=end_time,
@@ -111,102 +65,63 @@ def get_heatmap_from_wd(station_code, start_time, end_time,drawSpeLayerArrow:boo
     date_ = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S').date()
     
     # region 查询WPR数据
-    wpr_data = api.get_WPR_data(station_code,start_time,end_time)
-    assert isinstance(wpr_data, dict)
-    df = pd.DataFrame(wpr_data['data'])
-    columns = WPR_DataType.get_require_cols()
-    df = df[columns] # 只保留需要的数据
+    df = api.get_WPR_frame(station_code,start_time,end_time,WPR_DataType.get_require_dtypes()) # 只保留需要的数据
+    assert isinstance(df, pd.DataFrame)
     lst_time = list(sorted(df.groupby(WPR_DataType.TIMEPOINT.value.col_name).groups.keys()))
     # endregion
 
-    # region 查询高度数据
-    with SessionLocal() as db:
+    with SessionLocal() as db: # 同一个会话、同一个事务中完成查询与写入
+        # region 查询高度数据
         h_data = query_height_data(db, station_code=station_code, date_=date_)
-    # 没有时新增
-    if h_data is None:
-        # 查询高度
-        _, df0 = remove_over_height_data(df, lst_time[0])
-        height_list = df0[WPR_DataType.HEIGHT.value.col_name]
-        height_list = height_list.sort_values(ascending=False).tolist() # 倒序
-        # 创建高度数据实例
-        h_data = Hdata()
-        h_data.date = date_
-        h_data.station_code = station_code
-        h_data.height_list = height_list
-        h_data.targeted_height_list = get_targeted_height_list(height_list)
-        h_data.targeted_height_index = [height_list.index(h) for h in h_data.targeted_height_list]
+        # 没有时新增
+        if h_data is None:
+            # 查询高度
+            _, df0 = remove_over_height_data(df, lst_time[0])
+            height_list = df0[WPR_DataType.HEIGHT.value.col_name]
+            height_list = height_list.sort_values(ascending=False).tolist() # 倒序
+            # 创建高度数据实例
+            h_data = Hdata()
+            h_data.date = date_
+            h_data.station_code = station_code
+            height_index = get_height_index(station_code, height_list)
+            h_data.height_list = height_list
+            h_data.targeted_height_list = height_index.targeted_height_list
+            h_data.targeted_height_index = height_index.targeted_height_index
+            
+            h_data = add_height_data(db, h_data=h_data, commit=False)
+        assert isinstance(h_data, Hdata)
+        height_list = pd.Series(h_data.height_list)
+        # endregion 
         
-        with SessionLocal() as db:
-            h_data = add_height_data(db, h_data=h_data)
-    assert isinstance(h_data, Hdata)
-    height_list = pd.Series(h_data.height_list)
-    height_num = len(height_list)
-    df.set_index(WPR_DataType.HEIGHT.value.col_name, inplace=True) # 设置高度为index，后面用高度索引查找数据
-    # endregion 
-    
-    # region 查询风场数据
-    with SessionLocal() as db:
-        w_data_h = query_wind_datas(db, hid=h_data.id, is_horizon=True)
-    # endregion
-    
-    # region 检查是否有新的数据
-    time_point_ls = set([get_time_str(wd.time_point, TimeStr.YmdHMS) for wd in w_data_h])
-    
-    for t in lst_time:
-        if t in time_point_ls:
-            continue
-        # region 新增风场数据
-        df_time = df[df[WPR_DataType.TIMEPOINT.value.col_name]==t]
-        t = pd.to_datetime(t).to_pydatetime()
-        hws_origin = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.HWS, x)) # 原始水平风速
-        hwd = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.HWD, x)) # 水平风场
-        hws = hws_origin.tolist() # 水平风速
-
-        vws_origin = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.VWS, x)) # 原始垂直风速
-        vws = vws_origin * 20 # 垂直风速
+        # region 检查是否有新的数据
+        w_data_h = query_wind_datas(db, hid=h_data.id, is_horizon=True, is_remained=drawSpeLayerArrow)
+        time_point_ls = set([get_time_str(wd.time_point, TimeStr.YmdHMS) for wd in w_data_h])
+        df = df[~df[WPR_DataType.TIMEPOINT.value.col_name].isin(time_point_ls)]
+        # endregion
         
-        if drawSpeLayerArrow: # 保留特定高度
-            hwd_remained = [None] * height_num # 保留后的水平风场
-            hws_remained = [None] * height_num # 保留后的水平风速
-            vws_remained = [None] * height_num # 保留后的垂直风速
-            for idx in h_data.targeted_height_index:
-                hwd_remained[idx] = hwd[idx]
-                hws_remained[idx] = hws[idx]
-                vws_remained[idx] = vws[idx]
-            hwd = hwd_remained
-            hws = hws_remained
-            vws = vws_remained
-        else:
-            hwd = hwd.tolist()
-            vws = vws.tolist()
-        vwd = pd.Series(vws).apply(lambda x: np.where(x != 0, 180, x)).tolist()
+        # region 新增风场数据，一次批量写入
+        remained_mask = get_height_index(station_code, h_data.height_list).remained_mask if drawSpeLayerArrow else None
+        lst_time, matrices = compute_wind_fields(df, h_data.height_list, remained_mask)
         
-        with SessionLocal() as db: # 新增水平风场数据
-            hw_data = Wdata()
-            hw_data.hid = h_data.id
-            hw_data.time_point = t
-            hw_data.is_horizon = True
-            hw_data.is_remained = drawSpeLayerArrow
-            hw_data.origin_ws = hws_origin.tolist()
-            hw_data.ws = hws
-            hw_data.wd = hwd
-            add_wind_data(db, hw_data)
+        w_datas = []
+        for idx, t in enumerate(lst_time):
+            t = pd.to_datetime(t).to_pydatetime()
+            for is_horizon, (origin_ws, ws, wd) in [(True, ('OriginHWS', 'HWS', 'HWD')), (False, ('OriginVWS', 'VWS', 'VWD'))]:
+                w_data = Wdata()
+                w_data.hid = h_data.id
+                w_data.time_point = t
+                w_data.is_horizon = is_horizon # 水平或垂直风场数据
+                w_data.is_remained = drawSpeLayerArrow
+                w_data.origin_ws = to_json_list(matrices[origin_ws][:, idx])
+                w_data.ws = to_json_list(matrices[ws][:, idx])
+                w_data.wd = to_json_list(matrices[wd][:, idx])
+                w_datas.append(w_data)
+        add_wind_datas(db, w_datas, commit=False)
+        # endregion
         
-        with SessionLocal() as db: # 新增垂直风场数据
-            vw_data = Wdata()
-            vw_data.hid = h_data.id
-            vw_data.time_point = t
-            vw_data.is_horizon = False
-            vw_data.is_remained = drawSpeLayerArrow
-            vw_data.origin_ws = vws_origin.tolist()
-            vw_data.ws = vws
-            vw_data.wd = vwd
-            add_wind_data(db, vw_data) 
-        # endregion      
-    # endregion
-    
-    # 重新查询数据
-    with SessionLocal() as db:
+        db.commit()
+        
+        # 重新查询数据
         w_data_h = query_wind_datas(db, hid=h_data.id, is_horizon=True, is_remained=drawSpeLayerArrow)
         w_data_v = query_wind_datas(db, hid=h_data.id, is_horizon=False, is_remained=drawSpeLayerArrow)
         
@@ -247,158 +162,304 @@ def get_heatmap_from_wd(station_code, start_time, end_time,drawSpeLayerArrow:boo
 
     return result
         
-def get_heat_map_from_wdc(station_code, start_time, end_time,drawSpeLayerArrow:bool=True)-> HeatMapData:
+def get_incremental_start_time(date_, time_cols:list)->str:
+    ''' 根据已缓存的最后一个时间点，获取增量请求的起始时间（不包含已缓存的时间点）
+    :param date_:数据日期
+    :param time_cols:已缓存的时间列表，格式为HH:MM
+    :return str
+    '''
+    last_time = datetime.strptime(f'{date_} {max(time_cols)}', '%Y-%m-%d %H:%M')
+    return get_time_str(last_time + timedelta(seconds=1), TimeStr.YmdHMS)
+
+def get_wpr_fetch_window(station_code, start_time, end_time, drawSpeLayerArrow:bool=True, incremental:bool=True)->tuple|None:
+    ''' 获取需要向接口请求的风廓线雷达数据时间范围
+    :param stationCode: 站点编码
+    :param startTime:起始时间
+    :param endTime:结束时间
+    :param drawSpeLayerArrow:是否保留特定高度
+    :param incremental:是否只请求比缓存更新的时间点
+
+    :return tuple (起始时间, 结束时间)，已经缓存完成时返回None
+    '''
+    date_ = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S').date()
+    with SessionLocal() as db:
+        h_data = query_height_data(db, station_code=station_code, date_=date_)
+        if not isinstance(h_data, Hdata):
+            return start_time, end_time
+        if h_data.finish_cached == True:
+            return None
+        time_cols = query_cached_time_cols(db, hid=h_data.id, is_remained=drawSpeLayerArrow) if incremental else None
+    if time_cols:
+        return get_incremental_start_time(date_, time_cols), end_time
+    return start_time, end_time
+
+async def async_get_wpr_fetch_window(station_code, start_time, end_time, drawSpeLayerArrow:bool=True, incremental:bool=True)->tuple|None:
+    ''' get_wpr_fetch_window的异步版本，直接在事件循环中查询数据库 '''
+    date_ = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S').date()
+    async with AsyncSessionLocal() as db:
+        h_data = await async_crud.query_height_data(db, station_code=station_code, date_=date_)
+        if not isinstance(h_data, Hdata):
+            return start_time, end_time
+        if h_data.finish_cached == True:
+            return None
+        time_cols = await async_query_cached_time_cols(db, hid=h_data.id, is_remained=drawSpeLayerArrow) if incremental else None
+    if time_cols:
+        return get_incremental_start_time(date_, time_cols), end_time
+    return start_time, end_time
+
+async def async_get_cached_heat_map(station_code, start_time, end_time, drawSpeLayerArrow:bool=True)->HeatMapData|None:
+    ''' 在事件循环中读取已经缓存完成并压缩保存的风廓线雷达数据
+    :return HeatMapData 没有缓存完成或尚未压缩保存时返回None，需要调用get_heat_map_from_wdc
+    '''
+    date_ = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S').date()
+    cache_key = heatmap_cache.get_key(station_code, date_, drawSpeLayerArrow)
+    result = heatmap_cache.get(cache_key, start_time, end_time)
+    if result is not None:
+        return result
+    async with AsyncSessionLocal() as db:
+        h_data = await async_crud.query_height_data(db, station_code=station_code, date_=date_)
+        if not isinstance(h_data, Hdata) or h_data.finish_cached != True:
+            return None
+        packed = await async_crud.query_wind_data_packed(db, hid=h_data.id, is_remained=drawSpeLayerArrow)
+    if packed is None:
+        return None
+    horizontal_wind, vertical_wind = get_hv_wind_from_packed(packed)
+    
+    col_index = np.arange(0, len(packed.time_cols))
+    result = HeatMapData(station_code=station_code,
+        start_time=start_time, end_time=end_time,
+        horizontal_wind=horizontal_wind, vertical_wind=vertical_wind,
+        height_list=pd.Series(h_data.height_list), col_index=col_index
+    )
+    heatmap_cache.set(cache_key, result)
+    return result
+
+def get_heat_map_from_wdc(station_code, start_time, end_time,drawSpeLayerArrow:bool=True, wpr_data:pd.DataFrame|None=None, incremental:bool=True)-> HeatMapData:
     ''' 从数据库中获取风廓线雷达数据，并提取想要的数据
     :param stationCode: 站点编码
     :param startTime:起始时间
     :param endTime:结束时间
     :param drawSpeLayerArrow:是否保留特定高度
+    :param wpr_data:已经获取的风廓线雷达数据（见api.get_WPR_frame），为None时从接口获取
+    :param incremental:是否只请求比缓存更新的时间点，wpr_data不为None时不起作用
     
     :return HeatMapData
     '''
     # 数据日期
     date_ = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S').date()
-    with SessionLocal() as db:
+    # 已经缓存完成的数据优先从内存中读取
+    cache_key = heatmap_cache.get_key(station_code, date_, drawSpeLayerArrow)
+    result = heatmap_cache.get(cache_key, start_time, end_time)
+    if result is not None:
+        return result
+    cached_time_cols = []
+    with SessionLocal() as db: # 只读的会话
         h_data = query_height_data(db, station_code=station_code, date_=date_)
-    if isinstance(h_data, Hdata):
-        if h_data.finish_cached == True:# 已经缓存完成的直接查询热力图结果
-            with SessionLocal() as db:
-                # 查询风场数据
-                wind_data_combined = query_wind_data_combined(db, hid=h_data.id, is_remained=drawSpeLayerArrow)
-            horizontal_wind, vertical_wind = get_hv_wind(wind_data_combined)
-            
-            col_index = np.arange(0, len(wind_data_combined.time_cols))
-            result = HeatMapData(station_code=station_code,
-                start_time=start_time, end_time=end_time,
-                horizontal_wind=horizontal_wind, vertical_wind=vertical_wind,
-                height_list=pd.Series(h_data.height_list), col_index=col_index
-            )
-            return result
+        if isinstance(h_data, Hdata):
+            if h_data.finish_cached == True:# 已经缓存完成的直接查询热力图结果
+                height_list = pd.Series(h_data.height_list)
+                packed = query_wind_data_packed(db, hid=h_data.id, is_remained=drawSpeLayerArrow)
+                if packed is None: # 压缩保存之前缓存的数据，转换后再读取
+                    wind_data_combined = query_wind_data_combined(db, hid=h_data.id, is_remained=drawSpeLayerArrow)
+                    packed = add_wind_data_packed(db, pack_wind_data_combined(wind_data_combined))
+                horizontal_wind, vertical_wind = get_hv_wind_from_packed(packed)
+                
+                col_index = np.arange(0, len(packed.time_cols))
+                result = HeatMapData(station_code=station_code,
+                    start_time=start_time, end_time=end_time,
+                    horizontal_wind=horizontal_wind, vertical_wind=vertical_wind,
+                    height_list=height_list, col_index=col_index
+                )
+                heatmap_cache.set(cache_key, result)
+                return result
+            # 包括之前以JSON保存、尚未转换的时间点
+            cached_time_cols = query_cached_time_cols(db, hid=h_data.id, is_remained=drawSpeLayerArrow)
+    has_cached = len(cached_time_cols) > 0
         
     # region 查询WPR数据
-    wpr_data = api.get_WPR_data(station_code,start_time,end_time)
-    assert isinstance(wpr_data, dict)
-    df = pd.DataFrame(wpr_data['data'])
-    if len(df) == 0:
+    if wpr_data is None:
+        fetch_start_time = get_incremental_start_time(date_, cached_time_cols) if incremental and has_cached else start_time
+        wpr_data = api.get_WPR_frame(station_code,fetch_start_time,end_time,WPR_DataType.get_require_dtypes()) # 只保留需要的数据
+    assert isinstance(wpr_data, pd.DataFrame)
+    df = wpr_data
+    if len(df) == 0 and not has_cached:
         raise HTTPException(status_code=400, detail=f'【{start_time}--{end_time}】WPR data is Empty')
-    columns = WPR_DataType.get_require_cols()
-    df = df[columns] # 只保留需要的数据
     lst_time = list(sorted(df.groupby(WPR_DataType.TIMEPOINT.value.col_name).groups.keys()))
     # endregion
 
-    # region 高度数据没有时新增
-    if h_data is None:
-        # 查询高度
-        _, df0 = remove_over_height_data(df, lst_time[0])
-        height_list = df0[WPR_DataType.HEIGHT.value.col_name]
-        height_list = height_list.sort_values(ascending=False).tolist() # 倒序
-        # 创建高度数据实例
-        h_data = Hdata()
-        h_data.date = date_
-        h_data.station_code = station_code
-        h_data.height_list = height_list
-        h_data.targeted_height_list = get_targeted_height_list(height_list)
-        h_data.targeted_height_index = [height_list.index(h) for h in h_data.targeted_height_list]
-        
-        with SessionLocal() as db:
-            h_data = add_height_data(db, h_data=h_data)
-    assert isinstance(h_data, Hdata)
-    
-    height_list = pd.Series(h_data.height_list)
-    height_num = len(height_list)
-    df.set_index(WPR_DataType.HEIGHT.value.col_name, inplace=True) # 设置高度为index，后面用高度索引查找数据
-    # endregion 
-    
-    # 查询风场数据
-    with SessionLocal() as db:
-        wind_data_combined = query_wind_data_combined(db, hid=h_data.id, is_remained=drawSpeLayerArrow)
-    
-    if wind_data_combined is None:
-        # 创建一个新的数据
-        wind_data_combined = WDataCombined()
-        wind_data_combined.hid = h_data.id
-        wind_data_combined.is_remained = drawSpeLayerArrow
-        
-        wind_data_combined.time_cols = []
-        wind_data_combined.OriginHWS = {WPR_DataType.HEIGHT.value.col_name:h_data.height_list}
-        wind_data_combined.HWS = {WPR_DataType.HEIGHT.value.col_name:h_data.height_list}
-        wind_data_combined.HWD = {WPR_DataType.HEIGHT.value.col_name:h_data.height_list}
-        
-        wind_data_combined.OriginVWS = {WPR_DataType.HEIGHT.value.col_name:h_data.height_list}
-        wind_data_combined.VWS = {WPR_DataType.HEIGHT.value.col_name:h_data.height_list}
-        wind_data_combined.VWD = {WPR_DataType.HEIGHT.value.col_name:h_data.height_list}
-        
-    for t in lst_time:
-        time_col = get_time_str(pd.to_datetime(t).to_pydatetime(), TimeStr.HM)
-        if time_col in wind_data_combined.time_cols:
-            continue
-        wind_data_combined.time_cols.append(time_col)
-        df_time = df[df[WPR_DataType.TIMEPOINT.value.col_name]==t]
-        hws_origin = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.HWS, x)) # 原始水平风速
-        hwd = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.HWD, x)) # 水平风场
-        hws = hws_origin * 1 # 水平风速
-
-        vws_origin = height_list.apply(lambda x:get_wpr_data_by_height_idx(df_time, WPR_DataType.VWS, x)) # 原始垂直风速
-        vws = vws_origin * 20 # 垂直风速
+    with SessionLocal() as db: # 本次请求的所有写入在同一个事务中，最后一次提交
+        # region 高度数据没有时新增
+        if h_data is None:
+            # 查询高度
+            _, df0 = remove_over_height_data(df, lst_time[0])
+            height_list = df0[WPR_DataType.HEIGHT.value.col_name]
+            height_list = height_list.sort_values(ascending=False).tolist() # 倒序
+            # 创建高度数据实例
+            h_data = Hdata()
+            h_data.date = date_
+            h_data.station_code = station_code
+            height_index = get_height_index(station_code, height_list)
+            h_data.height_list = height_list
+            h_data.targeted_height_list = height_index.targeted_height_list
+            h_data.targeted_height_index = height_index.targeted_height_index
+            
+            h_data = add_height_data(db, h_data=h_data, commit=False)
+        assert isinstance(h_data, Hdata)
         
-        if drawSpeLayerArrow: # 保留特定高度
-            hwd_remained = [None] * height_num # 保留后的水平风场
-            hws_remained = [None] * height_num # 保留后的水平风速
-            vws_remained = [None] * height_num # 保留后的垂直风速
-            for idx in h_data.targeted_height_index:
-                hwd_remained[idx] = hwd[idx]
-                hws_remained[idx] = hws[idx]
-                vws_remained[idx] = vws[idx]
-            hwd = hwd_remained
-            hws = hws_remained
-            vws = vws_remained
-        else:
-            hwd = hwd.tolist()
-            hws = hwd.tolist()
-            vws = vws.tolist()
-        vwd = pd.Series(vws).apply(lambda x: np.where(x != 0, 180, x)).tolist()
+        hid, heights = h_data.id, list(h_data.height_list)
+        height_list = pd.Series(heights)
+        # endregion 
         
-        wind_data_combined.OriginHWS[time_col] = hws_origin.tolist()
-        wind_data_combined.HWS[time_col] = hws
-        wind_data_combined.HWD[time_col] = hwd
+        remained_mask = get_height_index(station_code, heights).remained_mask if drawSpeLayerArrow else None
+        lst_time, matrices = compute_wind_fields(df, heights, remained_mask)
         
-        wind_data_combined.OriginVWS[time_col] = vws_origin.tolist()
-        wind_data_combined.VWS[time_col] = vws
-        wind_data_combined.VWD[time_col] = vwd
+        # region 只追加新的时间点
+        # 之前以JSON保存的数据先转换为按时间点追加的格式
+        migrate_live_wind_data_combined(db, h_data=h_data, is_remained=drawSpeLayerArrow, commit=False)
+        cached_time_cols = set(cached_time_cols)
+        time_cols = [get_time_str(pd.to_datetime(t).to_pydatetime(), TimeStr.HM) for t in lst_time]
+        new_idx = [idx for idx, time_col in enumerate(time_cols) if time_col not in cached_time_cols]
+        if len(new_idx) > 0:
+            w_data_chunk = WDataChunk()
+            w_data_chunk.hid = hid
+            w_data_chunk.is_remained = drawSpeLayerArrow
+            w_data_chunk.time_point = pd.to_datetime(lst_time[new_idx[0]]).to_pydatetime()
+            w_data_chunk.time_cols = [time_cols[idx] for idx in new_idx]
+            w_data_chunk.dtype = 'float32'
+            w_data_chunk.data = pack_matrices({key: matrix[:, new_idx] for key, matrix in matrices.items()}, dtype=w_data_chunk.dtype)
+            add_wind_data_chunk(db, w_data_chunk, commit=False)
+        chunks = query_wind_data_chunks(db, hid=hid, is_remained=drawSpeLayerArrow)
+        time_cols, matrices = assemble_wind_data_chunks(chunks, height_num=len(heights))
+        # endregion
         
-    # 更新数据库
-    with SessionLocal() as db:
-        wind_data_combined = update_wind_data_combined(db, wind_data_combined)
-        horizontal_wind, vertical_wind = get_hv_wind(wind_data_combined)
-    if pd.to_datetime(end_time).hour==23:
-        with SessionLocal() as db:
+        finish_cached = pd.to_datetime(end_time).hour==23
+        if finish_cached: # 缓存完成的数据不再变化，合并为一条压缩保存的数据
+            add_wind_data_packed(db, get_wind_data_packed(hid, drawSpeLayerArrow, heights, time_cols, matrices), commit=False)
             h_data.finish_cached = True
-            update_height_data(db, h_data)
-            
-
-    col_index = np.arange(0, len(wind_data_combined.time_cols))
+            update_height_data(db, h_data, commit=False)
+        db.commit()
+    
+    horizontal_wind, vertical_wind = get_hv_wind_from_matrices(matrices, heights, time_cols)
+    col_index = np.arange(0, len(time_cols))
+    
     result = HeatMapData(station_code=station_code,
         start_time=start_time, end_time=end_time,
         horizontal_wind=horizontal_wind, vertical_wind=vertical_wind,
         height_list=height_list, col_index=col_index
     )
+    if finish_cached:
+        heatmap_cache.set(cache_key, result)
 
     return result
         
 def get_hv_wind(wind_data_combined:WDataCombined):
-    OriginHWS = pd.DataFrame(wind_data_combined.OriginHWS).set_index(WPR_DataType.HEIGHT.value.col_name)
-    HWS = pd.DataFrame(wind_data_combined.HWS).set_index(WPR_DataType.HEIGHT.value.col_name)
-    HWD = pd.DataFrame(wind_data_combined.HWD).set_index(WPR_DataType.HEIGHT.value.col_name)
+    def to_frame(data:dict)->pd.DataFrame: # 缺测的None转换为NaN，避免整列为None时变成object类型
+        return pd.DataFrame(data).set_index(WPR_DataType.HEIGHT.value.col_name).astype(np.float64)
+
+    OriginHWS = to_frame(wind_data_combined.OriginHWS)
+    HWS = to_frame(wind_data_combined.HWS)
+    HWD = to_frame(wind_data_combined.HWD)
     
-    OriginVWS = pd.DataFrame(wind_data_combined.OriginVWS).set_index(WPR_DataType.HEIGHT.value.col_name)
-    VWS = pd.DataFrame(wind_data_combined.VWS).set_index(WPR_DataType.HEIGHT.value.col_name)
-    VWD = pd.DataFrame(wind_data_combined.VWD).set_index(WPR_DataType.HEIGHT.value.col_name)
+    OriginVWS = to_frame(wind_data_combined.OriginVWS)
+    VWS = to_frame(wind_data_combined.VWS)
+    VWD = to_frame(wind_data_combined.VWD)
 
     horizontal_wind = WindFieldData(OriginWS=OriginHWS, WS=HWS, WD=HWD) # 水平风场数据
     vertical_wind = WindFieldData(OriginWS=OriginVWS, WS=VWS, WD=VWD) # 垂直风场数据
 
     return horizontal_wind, vertical_wind
 
+def get_wind_data_packed(hid:int, is_remained:bool, heights, time_cols:list, matrices:dict)->WDataPacked:
+    ''' 创建压缩保存的风场数据（未保存到数据库） '''
+    w_data_packed = WDataPacked()
+    w_data_packed.hid = hid
+    w_data_packed.is_remained = is_remained
+    w_data_packed.heights = list(heights)
+    w_data_packed.time_cols = list(time_cols)
+    w_data_packed.keys = WIND_FIELD_KEYS
+    w_data_packed.dtype = 'float32'
+    w_data_packed.data = pack_matrices(matrices, WIND_FIELD_KEYS, dtype=w_data_packed.dtype)
+    return w_data_packed
 
-    
+def get_wind_data_combined_matrices(wind_data_combined:WDataCombined)->dict:
+    ''' 将以JSON保存的风场数据转换为 高度×时间 的矩阵 '''
+    return {key: json_columns_to_matrix(getattr(wind_data_combined, key), wind_data_combined.time_cols) for key in WIND_FIELD_KEYS}
+
+def pack_wind_data_combined(wind_data_combined:WDataCombined)->WDataPacked:
+    ''' 将以JSON保存的风场数据转换为压缩保存的风场数据（未保存到数据库） '''
+    return get_wind_data_packed(
+        wind_data_combined.hid, wind_data_combined.is_remained,
+        wind_data_combined.OriginHWS[WPR_DataType.HEIGHT.value.col_name],
+        wind_data_combined.time_cols, get_wind_data_combined_matrices(wind_data_combined),
+    )
+
+def migrate_live_wind_data_combined(db, h_data:Hdata, is_remained:bool, commit:bool=True)->None:
+    ''' 将缓存未完成、以JSON保存的风场数据转换为一条TWindDataChunk '''
+    wind_data_combined = query_wind_data_combined(db, hid=h_data.id, is_remained=is_remained)
+    if wind_data_combined is None or len(wind_data_combined.time_cols) == 0 or len(wind_data_combined.OriginHWS) == 0:
+        return
+    time_cols = list(wind_data_combined.time_cols)
+    w_data_chunk = WDataChunk()
+    w_data_chunk.hid = h_data.id
+    w_data_chunk.is_remained = is_remained
+    w_data_chunk.time_point = datetime.combine(h_data.date, datetime.strptime(min(time_cols), '%H:%M').time())
+    w_data_chunk.time_cols = time_cols
+    w_data_chunk.dtype = 'float32'
+    w_data_chunk.data = pack_matrices(get_wind_data_combined_matrices(wind_data_combined), dtype=w_data_chunk.dtype)
+    add_wind_data_chunk(db, w_data_chunk, clear_combined=True, commit=commit)
+
+def query_cached_time_cols(db, hid:int, is_remained:bool)->list:
+    ''' 查询缓存未完成的数据中已缓存的时间列表 '''
+    time_cols = query_wind_data_chunk_time_cols(db, hid=hid, is_remained=is_remained)
+    combined_time_cols = query_wind_data_combined_time_cols(db, hid=hid, is_remained=is_remained) # 尚未转换的JSON数据
+    return time_cols + (combined_time_cols or [])
 
+async def async_query_cached_time_cols(db, hid:int, is_remained:bool)->list:
+    ''' query_cached_time_cols的异步版本 '''
+    time_cols = await async_crud.query_wind_data_chunk_time_cols(db, hid=hid, is_remained=is_remained)
+    combined_time_cols = await async_crud.query_wind_data_combined_time_cols(db, hid=hid, is_remained=is_remained)
+    return time_cols + (combined_time_cols or [])
+
+def assemble_wind_data_chunks(chunks:list, height_num:int)->tuple:
+    ''' 将按时间点追加保存的风场数据合并为 高度×时间 的矩阵，按时间排序，重复的时间点只保留一个
+    :return tuple (时间列表, 风场矩阵)
+    '''
+    time_cols = [time_col for chunk in chunks for time_col in chunk.time_cols]
+    if len(chunks) == 0:
+        data = np.empty((len(WIND_FIELD_KEYS), height_num, 0), dtype=np.float32)
+    else:
+        data = np.concatenate([unpack_stack(chunk.data, (height_num, len(chunk.time_cols)), dtype=chunk.dtype) for chunk in chunks], axis=2)
+    _, idx = np.unique(time_cols_to_minutes(time_cols), return_index=True)
+    if len(idx) != len(time_cols) or (np.diff(idx) < 0).any():
+        data = data[:, :, idx]
+        time_cols = [time_cols[i] for i in idx]
+    return time_cols, {key: data[i] for i, key in enumerate(WIND_FIELD_KEYS)}
+
+def get_hv_wind_from_matrices(matrices:dict, heights, time_cols:list):
+    frames = {key: matrix_to_frame(matrix, heights, time_cols) for key, matrix in matrices.items()}
+
+    horizontal_wind = WindFieldData(OriginWS=frames['OriginHWS'], WS=frames['HWS'], WD=frames['HWD']) # 水平风场数据
+    vertical_wind = WindFieldData(OriginWS=frames['OriginVWS'], WS=frames['VWS'], WD=frames['VWD']) # 垂直风场数据
+
+    return horizontal_wind, vertical_wind
+
+def get_hv_wind_from_packed(w_data_packed:WDataPacked):
+    ''' 读取压缩保存的风场数据，矩阵只读 '''
+    shape = (len(w_data_packed.heights), len(w_data_packed.time_cols))
+    matrices = unpack_matrices(w_data_packed.data, shape, w_data_packed.keys, w_data_packed.dtype)
+    return get_hv_wind_from_matrices(matrices, w_data_packed.heights, w_data_packed.time_cols)
+
+def migrate_wind_data_combined(vacuum:bool=True)->int:
+    ''' 将已有数据库中缓存完成、仍以JSON保存的风场数据转换为压缩保存
+    :param vacuum:转换后是否整理数据库文件，释放清空JSON后的空间
+    :return int 转换的条数
+    '''
+    with SessionLocal() as db:
+        ids = query_unpacked_wind_data_combined_ids(db)
+    for id in ids:
+        with SessionLocal() as db:
+            add_wind_data_packed(db, pack_wind_data_combined(query_wind_data_combined_by_id(db, id)))
+    if vacuum and len(ids) > 0:
+        with engine.connect() as conn:
+            conn.exec_driver_sql('VACUUM')
+    return len(ids)
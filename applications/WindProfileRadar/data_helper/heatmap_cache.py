@@ -0,0 +1,99 @@
+import copy
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Hashable
+from utils.config_manager import webConfig
+from .models import HeatMapData
+
+# 热力图数据内存缓存默认配置，config.yml中wpr.heatmap_cache的同名配置项会覆盖这些值
+DEFAULT_HEATMAP_CACHE_CONFIG = {
+    'enabled': True, # 是否缓存已经缓存完成的日期的热力图数据
+    'max_size_mb': 256, # 最大占用内存（MB），超出时淘汰最久未访问的数据
+}
+
+def get_heatmap_cache_config()->dict:
+    ''' 获取热力图数据内存缓存配置
+    :return dict
+    '''
+    config = dict(DEFAULT_HEATMAP_CACHE_CONFIG)
+    config.update(webConfig.wpr.get('heatmap_cache') or {})
+    return config
+
+class HeatMapCache():
+    ''' 已经构造好的热力图数据（HeatMapData）的内存缓存，按占用内存的大小限制容量，超出时按最近访问时间（LRU）淘汰
+
+    只应缓存已经缓存完成（finish_cached）的日期，这些数据不再变化；缓存的数据被并发的请求共享，绘图时不能修改
+
+    参数：
+    - max_size_mb:最大占用内存（MB）
+    - enabled:为False时不缓存
+    '''
+    def __init__(self, max_size_mb:float=256, enabled:bool=True):
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0 # 当前占用内存（字节）
+        self._items:OrderedDict[Hashable, tuple] = OrderedDict() # key: (HeatMapData, 占用内存)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(station_code:str, date_, is_remained:bool)->tuple:
+        ''' 缓存键：站点编码、数据日期、是否保留特定高度 '''
+        return station_code, str(date_), bool(is_remained)
+
+    def get(self, key:Hashable, start_time=None, end_time=None)->HeatMapData|None:
+        ''' 读取缓存，没有时返回None
+        :param start_time, end_time:请求的时间范围，与缓存的数据不同时返回替换了时间范围的浅拷贝，风场数据仍然共享
+        '''
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+        data = item[0]
+        if start_time is not None and end_time is not None:
+            data = copy.copy(data)
+            data.start_time = pd.to_datetime(start_time)
+            data.end_time = pd.to_datetime(end_time)
+        return data
+
+    def set(self, key:Hashable, data:HeatMapData)->None:
+        ''' 写入缓存，单个数据超过最大容量时不缓存 '''
+        if not self.enabled:
+            return
+        nbytes = data.nbytes
+        if nbytes > self.max_size:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._items[key] = (data, nbytes)
+            self.size += nbytes
+            while self.size > self.max_size:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def clear(self)->None:
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def stats(self)->dict:
+        ''' 缓存命中统计 '''
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions, 'count': len(self._items), 'size': self.size, 'max_size': self.max_size,
+        }
+
+_config = get_heatmap_cache_config()
+heatmap_cache = HeatMapCache(max_size_mb=_config['max_size_mb'], enabled=_config['enabled'])
@@ -1,9 +1,11 @@
+import hashlib
 import numpy as np
 import pandas as pd
 import math
 
 from utils.common import timestr2timedelta
 from .utils import calcUV, get_grid_coord, get_add_x
+from .utils import matrix_to_frame, time_cols_to_minutes, minutes_to_time_cols
 
 class WindFieldData():
     ''' 风场数据
@@ -20,6 +22,10 @@ class WindFieldData():
         self.WS = WS
         self.WD = WD
         self.U, self.V = calcUV(WS, WD,to_nan=True)
+
+    @property
+    def nbytes(self)->int:
+        return sum(get_nbytes(data) for data in [self.OriginWS, self.WS, self.WD, self.U, self.V])
          
 class HeapMapGrid():
     '''热力图网格'''
@@ -44,6 +50,23 @@ class HeatMapData():
         self.col_index = col_index
         self.height_list = height_list
 
+    @property
+    def nbytes(self)->int:
+        ''' 占用的内存（字节），包括网格坐标 '''
+        return (self.horizontal_wind.nbytes + self.vertical_wind.nbytes + get_nbytes(self.grid.x) + get_nbytes(self.grid.y)
+            + get_nbytes(self.col_index) + get_nbytes(self.height_list))
+
+    def get_version(self)->str:
+        ''' 数据版本：站点、时间范围以及风场数据（含高度、时间列）的哈希值，数据相同时版本相同，用于图片缓存的键 '''
+        hasher = hashlib.sha256(f'{self.station_code}|{self.start_time}|{self.end_time}'.encode('utf-8'))
+        hasher.update(np.asarray(self.col_index, dtype=np.float64).tobytes())
+        for wind_data in [self.horizontal_wind, self.vertical_wind]:
+            for frame in [wind_data.OriginWS, wind_data.WS, wind_data.WD]:
+                hasher.update('|'.join(map(str, frame.index)).encode('utf-8'))
+                hasher.update('|'.join(map(str, frame.columns)).encode('utf-8'))
+                hasher.update(to_matrix(frame, np.float64).tobytes())
+        return hasher.hexdigest()
+
     def get_last_time(self)->str:
         '''获取最后的风廓线雷达的时间'''
         hw_time = list(self.horizontal_wind.OriginWS.columns)
@@ -62,4 +85,131 @@ class HeatMapData():
     @property
     def add_x(self):
         '''Scalex轴方向上的偏移位置'''
-        return get_add_x(h=(self.end_time-self.start_time).total_seconds()/3600,c=-0.2)
\ No newline at end of file
+        return get_add_x(h=(self.end_time-self.start_time).total_seconds()/3600,c=-0.2)
+
+class CompactWindField():
+    ''' 紧凑的风场数据，只保存连续存放的 高度×时间 矩阵，U、V风在需要时计算
+
+    属性：
+    - origin_ws:原始风速
+    - ws:处理后的风速
+    - wd:处理后的风向
+    '''
+    __slots__ = ('origin_ws', 'ws', 'wd')
+
+    def __init__(self, origin_ws, ws, wd, dtype=np.float32):
+        self.origin_ws = to_matrix(origin_ws, dtype)
+        self.ws = to_matrix(ws, dtype)
+        self.wd = to_matrix(wd, dtype)
+
+    @property
+    def nbytes(self)->int:
+        return self.origin_ws.nbytes + self.ws.nbytes + self.wd.nbytes
+
+    def get_uv(self):
+        ''' :return Tuple(np.ndarray) U、V风 '''
+        return calcUV(self.ws, self.wd, to_nan=True)
+
+    @classmethod
+    def from_wind_field(cls, wind_field:WindFieldData, dtype=np.float32):
+        return cls(wind_field.OriginWS, wind_field.WS, wind_field.WD, dtype=dtype)
+
+    def to_wind_field(self, height_list, time_cols)->WindFieldData:
+        ''' 转换为index为高度、列为时间的WindFieldData '''
+        return WindFieldData(
+            OriginWS=matrix_to_frame(self.origin_ws.astype(np.float64), height_list, time_cols),
+            WS=matrix_to_frame(self.ws.astype(np.float64), height_list, time_cols),
+            WD=matrix_to_frame(self.wd.astype(np.float64), height_list, time_cols),
+        )
+
+class CompactHeatMap():
+    ''' 紧凑的热力图数据，水平、垂直风场共用同一个高度轴和时间轴，网格坐标不再预先生成
+
+    属性：
+    - heights:高度轴，与矩阵的行对应
+    - minutes:时间轴，当天0点起的分钟数，与矩阵的列对应
+    - horizontal_wind, vertical_wind:水平、垂直风场数据
+
+    默认以float32保存风场矩阵；dtype为np.float64时与HeatMapData之间的转换无损
+    '''
+    __slots__ = ('station_code', 'start_time', 'end_time', 'heights', 'minutes', 'horizontal_wind', 'vertical_wind')
+
+    def __init__(self, station_code, start_time, end_time,
+            horizontal_wind:CompactWindField, vertical_wind:CompactWindField, heights, minutes):
+        self.station_code = station_code
+        self.start_time = pd.to_datetime(start_time)
+        self.end_time = pd.to_datetime(end_time)
+        self.horizontal_wind = horizontal_wind
+        self.vertical_wind = vertical_wind
+        self.heights = np.asarray(heights)
+        self.minutes = np.asarray(minutes, dtype=np.int16)
+
+    @property
+    def shape(self)->tuple:
+        return len(self.heights), len(self.minutes)
+
+    @property
+    def nbytes(self)->int:
+        return self.horizontal_wind.nbytes + self.vertical_wind.nbytes + self.heights.nbytes + self.minutes.nbytes
+
+    @property
+    def time_cols(self)->list:
+        return minutes_to_time_cols(self.minutes)
+
+    @property
+    def col_index(self)->np.ndarray:
+        return np.arange(0, len(self.minutes))
+
+    def get_grid(self, addition:float=0.5):
+        ''' 网格坐标，x、y为一维数组，需要二维坐标时由matplotlib自动展开
+        :return Tuple(np.ndarray) x, y
+        '''
+        return np.arange(len(self.minutes)) + addition, np.arange(len(self.heights)) + addition
+
+    def get_last_time(self)->str:
+        '''获取最后的风廓线雷达的时间'''
+        return minutes_to_time_cols([self.minutes.max()])[0]
+
+    def get_last_hour(self)->int:
+        '''获取最后的风廓线雷达的小时-整点'''
+        return int(self.minutes.max()) // 60
+
+    @property
+    def add_x(self):
+        '''Scalex轴方向上的偏移位置'''
+        return get_add_x(h=(self.end_time-self.start_time).total_seconds()/3600,c=-0.2)
+
+    @classmethod
+    def from_heatmap(cls, data:HeatMapData, dtype=np.float32):
+        ''' 由HeatMapData转换 '''
+        return cls(
+            station_code=data.station_code, start_time=data.start_time, end_time=data.end_time,
+            horizontal_wind=CompactWindField.from_wind_field(data.horizontal_wind, dtype=dtype),
+            vertical_wind=CompactWindField.from_wind_field(data.vertical_wind, dtype=dtype),
+            heights=np.asarray(data.height_list),
+            minutes=time_cols_to_minutes(data.horizontal_wind.WS.columns),
+        )
+
+    def to_heatmap(self)->HeatMapData:
+        ''' 转换为HeatMapData，供现有的绘图代码使用 '''
+        time_cols = self.time_cols
+        return HeatMapData(station_code=self.station_code,
+            start_time=self.start_time, end_time=self.end_time,
+            horizontal_wind=self.horizontal_wind.to_wind_field(self.heights, time_cols),
+            vertical_wind=self.vertical_wind.to_wind_field(self.heights, time_cols),
+            height_list=pd.Series(self.heights), col_index=self.col_index,
+        )
+
+def to_matrix(data:pd.DataFrame|np.ndarray, dtype=np.float32)->np.ndarray:
+    ''' 转换为连续存放的二维数组，None转换为NaN '''
+    if isinstance(data, pd.DataFrame):
+        return np.ascontiguousarray(data.to_numpy(dtype=dtype, na_value=np.nan))
+    return np.ascontiguousarray(data, dtype=dtype)
+
+def get_nbytes(data)->int:
+    ''' DataFrame、Series或数组占用的内存（字节） '''
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum())
+    if isinstance(data, pd.Series):
+        return int(data.memory_usage(index=True, deep=True))
+    return int(getattr(data, 'nbytes', 0))
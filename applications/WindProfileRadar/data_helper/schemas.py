@@ -57,6 +57,12 @@ class WPR_DataType(Enum):
         # 返回WPR_DataType里所有Annotation的一个列表：[a.col_name for a in WPR_DataType]
         return [a.value.col_name for a in WPR_DataType]
 
+    @staticmethod
+    def get_require_dtypes()->dict:
+        ''' :return dict 需要的数据的列名及其类型，时间为str，高度为int，其余为float '''
+        dtypes = {WPR_DataType.TIMEPOINT: str, WPR_DataType.HEIGHT: int}
+        return {a.value.col_name: dtypes.get(a, float) for a in WPR_DataType}
+
     @staticmethod
     def get_name_list()->list:
         ''' :return 需要的数据的中文名的列表'''
@@ -1,7 +1,8 @@
 import numpy as np
 import math
+import zlib
 import pandas as pd
-from typing import Dict,List
+from typing import Dict,List,Tuple
 from .schemas import WPR_DataType,Pollutants
 from utils.common import get_time_str
 
@@ -58,6 +59,111 @@ def concat_series(series_list:List[pd.Series], index_values, keys)->pd.DataFrame
     df.columns = keys
     return df
 
+WIND_FIELD_KEYS = ['OriginHWS', 'HWS', 'HWD', 'OriginVWS', 'VWS', 'VWD'] # 风场矩阵的名称，与TWindDataCombined的列名一致
+
+def pivot_wind_field(df:pd.DataFrame, height_list)->Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    ''' 将原始风廓线雷达数据一次性整理为 高度×时间 的矩阵
+
+    参数：
+    - df:风廓线雷达数据，需包含时间、高度、水平风速、水平风向、垂直风速列
+    - height_list:高度列表，决定矩阵的行顺序，不在列表里的高度被丢弃
+
+    返回：
+    - time_points:按时间排序的时间点
+    - hws, hwd, vws:水平风速、水平风向、垂直风速矩阵，缺测为NaN
+    '''
+    heights = np.asarray(height_list, dtype=np.float64)
+    time_points, col = np.unique(df[WPR_DataType.TIMEPOINT.value.col_name].to_numpy(), return_inverse=True)
+    valid, row = get_height_rows(heights, df[WPR_DataType.HEIGHT.value.col_name].to_numpy(dtype=np.float64))
+    col = col[valid]
+
+    matrices = []
+    for dt in [WPR_DataType.HWS, WPR_DataType.HWD, WPR_DataType.VWS]:
+        matrix = np.full((len(heights), len(time_points)), np.nan)
+        matrix[row, col] = df[dt.value.col_name].to_numpy(dtype=np.float64)[valid]
+        matrices.append(matrix)
+    return time_points, *matrices
+
+def get_height_rows(heights:np.ndarray, data_heights:np.ndarray)->Tuple[np.ndarray, np.ndarray]:
+    ''' 用二分查找把每条数据的高度映射到矩阵的行
+
+    参数：
+    - heights:高度列表，即矩阵各行对应的高度
+    - data_heights:每条数据的高度
+
+    返回：
+    - valid:高度在列表里的数据
+    - row:valid数据对应的行
+    '''
+    order = np.argsort(heights)
+    sorted_heights = heights[order]
+    pos = np.clip(np.searchsorted(sorted_heights, data_heights), 0, max(len(heights) - 1, 0))
+    valid = sorted_heights[pos] == data_heights if len(heights) else np.zeros(len(data_heights), dtype=bool)
+    return valid, order[pos[valid]]
+
+def get_wind_field_matrices(hws:np.ndarray, hwd:np.ndarray, vws:np.ndarray, remained_mask:np.ndarray|None=None)->Dict[str, np.ndarray]:
+    ''' 由原始风场矩阵计算绘图所需的风场矩阵
+
+    参数：
+    - hws, hwd, vws:水平风速、水平风向、垂直风速矩阵（高度×时间）
+    - remained_mask:需要保留的高度层（行），为None时保留所有高度
+
+    返回：
+    - dict，键见WIND_FIELD_KEYS
+    '''
+    hws_ = hws * 1
+    hwd_ = hwd.copy()
+    vws_ = vws * 20
+    if remained_mask is not None:
+        hws_[~remained_mask] = np.nan
+        hwd_[~remained_mask] = np.nan
+        vws_[~remained_mask] = np.nan
+    vwd_ = np.where(vws_ != 0, 180, vws_) # 垂直风场箭头的方向
+    return dict(OriginHWS=hws, HWS=hws_, HWD=hwd_, OriginVWS=vws, VWS=vws_, VWD=vwd_)
+
+def matrix_to_frame(matrix:np.ndarray, height_list, time_cols)->pd.DataFrame:
+    ''' 将 高度×时间 的矩阵转换为index为高度，列为时间的DataFrame '''
+    return pd.DataFrame(matrix, index=pd.Index(height_list, name=WPR_DataType.HEIGHT.value.col_name), columns=time_cols)
+
+def time_cols_to_minutes(time_cols)->np.ndarray:
+    ''' 将HH:MM格式的时间列转换为当天0点起的分钟数 '''
+    minutes = [int(h) * 60 + int(m) for h, m in (str(t).split(':') for t in time_cols)]
+    return np.array(minutes, dtype=np.int16)
+
+def minutes_to_time_cols(minutes)->List[str]:
+    ''' 将当天0点起的分钟数转换为HH:MM格式的时间列 '''
+    return [f'{m // 60:02d}:{m % 60:02d}' for m in np.asarray(minutes).tolist()]
+
+def pack_matrices(matrices:Dict[str, np.ndarray], keys:List[str]=WIND_FIELD_KEYS, dtype:str='float32', level:int=6)->bytes:
+    ''' 将形状相同的多个矩阵按keys的顺序压缩为一个二进制数据 '''
+    data = np.stack([np.asarray(matrices[key], dtype=np.float64) for key in keys]).astype(dtype)
+    return zlib.compress(np.ascontiguousarray(data).tobytes(), level)
+
+def unpack_matrices(data:bytes, shape:tuple, keys:List[str]=WIND_FIELD_KEYS, dtype:str='float32')->Dict[str, np.ndarray]:
+    ''' 解压pack_matrices的结果
+    :param shape:单个矩阵的形状 (高度数, 时间数)
+    :return dict 只读的矩阵
+    '''
+    matrices = unpack_stack(data, shape, len(keys), dtype)
+    return {key: matrices[idx] for idx, key in enumerate(keys)}
+
+def unpack_stack(data:bytes, shape:tuple, count:int=len(WIND_FIELD_KEYS), dtype:str='float32')->np.ndarray:
+    ''' 解压pack_matrices的结果
+    :return np.ndarray 形状为 (count, *shape) 的只读数组
+    '''
+    return np.frombuffer(zlib.decompress(data), dtype=dtype).reshape(count, *shape)
+
+def json_columns_to_matrix(data:dict, time_cols:list)->np.ndarray:
+    ''' 将以时间为键、每列为高度上的值的JSON数据转换为 高度×时间 的矩阵，None转换为NaN '''
+    columns = [data[time_col] for time_col in time_cols]
+    if len(columns) == 0:
+        return np.empty((len(data.get(WPR_DataType.HEIGHT.value.col_name, [])), 0))
+    return np.array(columns, dtype=np.float64).T
+
+def to_json_list(values:np.ndarray)->list:
+    ''' 将一维数组转换为可保存为JSON的列表，NaN转换为None '''
+    return np.where(np.isnan(values), None, values).tolist()
+
 def get_wpr_data_by(wpr_data:pd.DataFrame,wpr_data_type:WPR_DataType,by_val,by:str,nan=np.NAN):
     ''' 根据by_val查找wpr的数据
     :param wpr_data:风廓线雷达数据
@@ -100,15 +206,52 @@ def minus2rep(val ,rep=""):
         return result
    
 def get_targeted_height_list(height_list):
-    targeted_height_list = []
-    for item in Height_List:
-        if item in height_list:
-            targeted_height_list.append(item)
-        else:
-            targeted_height_list.append(min(i for i in height_list if i > item))
-    targeted_height_list = list(set(targeted_height_list))
-    return targeted_height_list
-    
+    ''' 获取各层风场箭头对应的高度：Height_List中的高度在height_list里时取该高度，否则取高于它的最低高度 '''
+    heights = np.sort(np.asarray(height_list))
+    pos = np.searchsorted(heights, Height_List) # 第一个不低于目标高度的位置
+    if len(heights) == 0 or pos.max() >= len(heights):
+        raise ValueError(f'高度列表中没有不低于{Height_List.max()}的高度')
+    return list(set(heights[pos].tolist()))
+
+class HeightIndex():
+    ''' 站点的高度层索引，站点的高度层基本不变，同一组高度层只计算一次
+
+    属性：
+    - height_list:高度列表（倒序），与风场矩阵的行对应
+    - targeted_height_list:各层风场箭头对应的高度
+    - targeted_height_index:targeted_height_list在height_list中的位置
+    - remained_mask:需要保留的行
+    '''
+    def __init__(self, height_list):
+        self.height_list = list(height_list)
+        heights = np.asarray(self.height_list)
+        order = np.argsort(heights, kind='stable')
+        pos = np.searchsorted(heights[order], Height_List) # 二分查找第一个不低于目标高度的位置
+        if len(heights) == 0 or pos.max() >= len(heights):
+            raise ValueError(f'高度列表中没有不低于{Height_List.max()}的高度')
+        self.targeted_height_index = np.unique(order[pos]).tolist()
+        self.targeted_height_list = heights[self.targeted_height_index].tolist()
+        self.remained_mask = np.zeros(len(heights), dtype=bool)
+        self.remained_mask[self.targeted_height_index] = True
+        self.remained_mask.setflags(write=False) # 被多个请求共享，不允许修改
+
+    def is_same(self, height_list)->bool:
+        return self.height_list == list(height_list)
+
+_height_indexes:Dict[str, HeightIndex] = {}
+
+def get_height_index(station_code:str, height_list)->HeightIndex:
+    ''' 获取站点的高度层索引，高度层变化时重新计算
+    :param station_code:站点编码
+    :param height_list:高度列表（倒序）
+    :return HeightIndex
+    '''
+    height_index = _height_indexes.get(station_code)
+    if height_index is None or not height_index.is_same(height_list):
+        height_index = HeightIndex(height_list)
+        _height_indexes[station_code] = height_index
+    return height_index
+
 def remain_special_layers(w_data:pd.DataFrame,targeted_height_list=None):
     ''' 指定高度的风场
     :param w_data:风场数据，index为height
@@ -118,9 +261,7 @@ def remain_special_layers(w_data:pd.DataFrame,targeted_height_list=None):
         height_list = w_data.index.values
         targeted_height_list = get_targeted_height_list(height_list)
 
-    for idx, _ in w_data.iterrows():
-        if idx not in targeted_height_list:
-            w_data.loc[idx] = None
+    w_data.loc[~np.isin(w_data.index.values, targeted_height_list)] = None
     return w_data
 
 def get_mask(ws_data):
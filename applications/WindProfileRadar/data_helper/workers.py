@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context, shared_memory, resource_tracker
+from typing import Dict, List, Tuple
+from utils.config_manager import webConfig
+from .schemas import WPR_DataType
+from .utils import WIND_FIELD_KEYS, get_height_rows, get_wind_field_matrices, pivot_wind_field
+
+# 风场矩阵计算进程池默认配置，config.yml中wpr.workers的同名配置项会覆盖这些值
+DEFAULT_WORKER_CONFIG = {
+    'enabled': True, # 是否启用进程池，不启用时在当前线程中计算
+    'processes': None, # 进程数，为None时等于CPU核数
+    'chunk_size': 48, # 每个任务处理的时间点个数
+    'min_rows': 100000, # 数据条数少于该值时直接在当前线程中计算，避免进程间调度的开销
+    'start_method': None, # 子进程的启动方式（fork/spawn/forkserver），为None时使用系统默认值
+}
+INPUT_COLS = [WPR_DataType.HEIGHT, WPR_DataType.HWS, WPR_DataType.HWD, WPR_DataType.VWS] # 放入共享内存的数值列
+
+def get_worker_config()->dict:
+    ''' 获取风场矩阵计算进程池配置
+    :return dict
+    '''
+    config = dict(DEFAULT_WORKER_CONFIG)
+    config.update(webConfig.wpr.get('workers') or {})
+    return config
+
+def _warm_up()->int:
+    ''' 子进程中执行：导入本模块及其依赖 '''
+    return os.getpid()
+
+def _fill_chunk(job:dict, c0:int, c1:int, r0:int, r1:int)->None:
+    ''' 子进程中执行：计算第c0~c1个时间点（对应第r0~r1条数据）的风场矩阵，结果直接写入共享内存 '''
+    shm_in = shared_memory.SharedMemory(name=job['input'])
+    shm_out = shared_memory.SharedMemory(name=job['output'])
+    try:
+        _compute_chunk(shm_in.buf, shm_out.buf, job, c0, c1, r0, r1)
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+def _compute_chunk(buf_in, buf_out, job:dict, c0:int, c1:int, r0:int, r1:int)->None:
+    n, heights = job['n'], job['heights']
+    values = np.ndarray((len(INPUT_COLS), n), dtype=np.float64, buffer=buf_in)
+    cols = np.ndarray((n,), dtype=np.int64, buffer=buf_in, offset=values.nbytes)
+    out = np.ndarray((len(WIND_FIELD_KEYS), len(heights), job['time_num']), dtype=np.float64, buffer=buf_out)
+
+    data_heights, hws, hwd, vws = values[:, r0:r1]
+    valid, row = get_height_rows(heights, data_heights)
+    col = cols[r0:r1][valid] - c0
+    raw = []
+    for data in [hws, hwd, vws]:
+        matrix = np.full((len(heights), c1 - c0), np.nan)
+        matrix[row, col] = data[valid]
+        raw.append(matrix)
+    matrices = get_wind_field_matrices(*raw, job['remained_mask'])
+    for idx, key in enumerate(WIND_FIELD_KEYS):
+        out[idx, :, c0:c1] = matrices[key]
+
+class SharedWindFieldJob():
+    ''' 一次风场矩阵计算：数值列与结果矩阵都放在共享内存中，按时间点分块提交给进程池，
+    子进程只接收共享内存的名称和分块范围，不需要序列化DataFrame
+    '''
+    def __init__(self, executor:ProcessPoolExecutor, df:pd.DataFrame, height_list, remained_mask:np.ndarray|None, chunk_size:int):
+        heights = np.asarray(height_list, dtype=np.float64)
+        self.time_points, cols = np.unique(df[WPR_DataType.TIMEPOINT.value.col_name].to_numpy(), return_inverse=True)
+        order = np.argsort(cols, kind='stable') # 按时间排序，使每个分块的数据在共享内存中连续
+        cols = cols[order].astype(np.int64)
+        n, time_num = len(cols), len(self.time_points)
+        self.shape = (len(WIND_FIELD_KEYS), len(heights), time_num)
+        self.futures = []
+        self._output = None
+        self._input = shared_memory.SharedMemory(create=True, size=max((len(INPUT_COLS) + 1) * n * 8, 1))
+        try:
+            values = np.ndarray((len(INPUT_COLS), n), dtype=np.float64, buffer=self._input.buf)
+            for idx, dt in enumerate(INPUT_COLS):
+                values[idx] = df[dt.value.col_name].to_numpy(dtype=np.float64)[order]
+            np.ndarray((n,), dtype=np.int64, buffer=self._input.buf, offset=values.nbytes)[:] = cols
+            del values
+            self._output = shared_memory.SharedMemory(create=True, size=max(int(np.prod(self.shape)) * 8, 1))
+
+            job = {
+                'input': self._input.name, 'output': self._output.name, 'n': n, 'time_num': time_num,
+                'heights': heights, 'remained_mask': remained_mask,
+            }
+            for c0 in range(0, time_num, chunk_size):
+                c1 = min(c0 + chunk_size, time_num)
+                r0, r1 = np.searchsorted(cols, [c0, c1])
+                self.futures.append(executor.submit(_fill_chunk, job, c0, c1, int(r0), int(r1)))
+        except BaseException:
+            self.close()
+            raise
+
+    def result(self)->Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        ''' 等待所有分块计算完成
+        :return tuple (按时间排序的时间点, 风场矩阵)，风场矩阵的键见WIND_FIELD_KEYS
+        '''
+        try:
+            for future in self.futures:
+                future.result()
+            out = np.ndarray(self.shape, dtype=np.float64, buffer=self._output.buf).copy()
+        finally:
+            self.close()
+        return self.time_points, {key: out[idx] for idx, key in enumerate(WIND_FIELD_KEYS)}
+
+    def close(self)->None:
+        ''' 等待已提交的分块结束后释放共享内存 '''
+        wait(self.futures)
+        for shm in [self._input, self._output]:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._input = self._output = None
+
+class WindFieldPool():
+    ''' 常驻的风场矩阵计算进程池，在应用启动时调用start()创建子进程，关闭时调用shutdown()
+
+    未启动或数据量较小时在当前线程中计算，结果与pivot_wind_field+get_wind_field_matrices一致
+    '''
+    def __init__(self):
+        self.config = get_worker_config()
+        self._executor = None
+
+    @property
+    def started(self)->bool:
+        return self._executor is not None
+
+    def start(self)->None:
+        if self.started or not self.config['enabled']:
+            return
+        processes = self.config['processes'] or os.cpu_count() or 1
+        if os.name == 'posix':
+            resource_tracker.ensure_running() # 子进程与主进程共用同一个共享内存追踪进程，否则共享内存释放后会被重复清理
+        self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=get_context(self.config['start_method']))
+        # 启动时就创建所有子进程并导入依赖，避免第一次请求时再创建
+        for future in [self._executor.submit(_warm_up) for _ in range(processes)]:
+            future.result()
+
+    def shutdown(self)->None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def compute(self, jobs:List[Tuple[pd.DataFrame, list, np.ndarray|None]])->List[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        ''' 计算多组风场矩阵，所有分块同时提交，多站点、多日期的数据可以并行处理
+        :param jobs:[(风廓线雷达数据, 高度列表, 需要保留的高度层)]
+        :return List[tuple] 与jobs顺序一致，每项为(按时间排序的时间点, 风场矩阵)
+        '''
+        results = [None] * len(jobs)
+        shared_jobs = []
+        try:
+            for idx, (df, height_list, remained_mask) in enumerate(jobs):
+                if self._executor is None or len(df) < self.config['min_rows']:
+                    time_points, hws, hwd, vws = pivot_wind_field(df, height_list)
+                    results[idx] = time_points, get_wind_field_matrices(hws, hwd, vws, remained_mask)
+                else:
+                    shared_jobs.append((idx, SharedWindFieldJob(self._executor, df, height_list, remained_mask, self.config['chunk_size'])))
+            for idx, job in shared_jobs:
+                results[idx] = job.result()
+        finally:
+            for _, job in shared_jobs:
+                job.close()
+        return results
+
+wind_field_pool = WindFieldPool()
+
+def compute_wind_fields(df:pd.DataFrame, height_list, remained_mask:np.ndarray|None=None)->Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    ''' 由原始风廓线雷达数据计算 高度×时间 的风场矩阵，进程池已启动且数据量较大时在子进程中计算
+
+    参数：
+    - df:风廓线雷达数据
+    - height_list:高度列表，决定矩阵的行顺序
+    - remained_mask:需要保留的高度层（行），为None时保留所有高度
+
+    返回：
+    - time_points:按时间排序的时间点
+    - matrices:风场矩阵，键见WIND_FIELD_KEYS
+    '''
+    return wind_field_pool.compute([(df, height_list, remained_mask)])[0]
@@ -0,0 +1,163 @@
+''' crud的异步版本，基于AsyncSession（aiosqlite），可以直接在事件循环中调用
+
+用法：
+    async with AsyncSessionLocal() as db:
+        h_data = await query_height_data(db, station_code, date_)
+'''
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from traceback import print_exc
+from typing import List
+from datetime import date
+from .models import THeightData as Hdata
+from .models import TWindData as Wdata
+from .models import TWindDataCombined as WDataCombined
+from .models import TWindDataPacked as WDataPacked
+from .models import TWindDataChunk as WDataChunk
+from .crud import to_row # 导入crud时会执行数据库迁移
+
+async def commit_or_flush(db:AsyncSession, commit:bool=True)->None:
+    ''' commit为False时只发送到数据库，由调用方在同一个事务中统一提交 '''
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+
+async def bulk_insert(db:AsyncSession, model, rows:List[dict], commit:bool=True)->int:
+    ''' 批量新增，一条INSERT ... ON CONFLICT DO NOTHING语句，违反唯一约束的行被忽略
+    :return int 提交的行数
+    '''
+    if len(rows) == 0:
+        return 0
+    await db.execute(sqlite_insert(model).on_conflict_do_nothing(), rows)
+    await commit_or_flush(db, commit)
+    return len(rows)
+
+async def upsert(db:AsyncSession, model, row:dict, index_elements:list, update_cols:list, commit:bool=True)->None:
+    ''' 新增一行，index_elements对应的唯一索引冲突时只更新update_cols '''
+    stmt = sqlite_insert(model).values(**row)
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_={col: stmt.excluded[col] for col in update_cols})
+    await db.execute(stmt)
+    await commit_or_flush(db, commit)
+
+# region 高度数据
+async def add_height_data(db:AsyncSession, h_data:Hdata, commit:bool=True):
+    ''' 新增高度数据，同一站点、同一日期已存在时返回已有的数据 '''
+    try:
+        stmt = sqlite_insert(Hdata).values(**to_row(h_data)).on_conflict_do_nothing(index_elements=['station_code', 'date'])
+        await db.execute(stmt)
+        await commit_or_flush(db, commit)
+        return await query_height_data(db, station_code=h_data.station_code, date_=h_data.date)
+    except Exception as e:
+        print_exc()
+
+async def query_height_data(db:AsyncSession, station_code:str, date_:date):
+    try:
+        return await db.scalar(select(Hdata).filter(Hdata.station_code==station_code, Hdata.date==date_).limit(1))
+    except Exception as e:
+        print_exc()
+
+async def update_height_data(db:AsyncSession, h_data:Hdata, commit:bool=True):
+    try:
+        # 按唯一索引(station_code, date)更新h_data
+        await db.execute(update(Hdata).filter(Hdata.station_code==h_data.station_code, Hdata.date==h_data.date).values({
+            Hdata.finish_cached: h_data.finish_cached,
+        }).execution_options(synchronize_session=False))
+        await commit_or_flush(db, commit)
+        return await query_height_data(db, station_code=h_data.station_code, date_=h_data.date)
+    except Exception as e:
+        print_exc()
+# endregion
+
+# region 风场数据
+async def add_wind_datas(db:AsyncSession, w_datas:List[Wdata], commit:bool=True)->int:
+    ''' 批量新增风场数据，已存在的时间点由唯一索引跳过
+    :return int 提交的条数
+    '''
+    try:
+        return await bulk_insert(db, Wdata, [to_row(w_data) for w_data in w_datas], commit=commit)
+    except Exception as e:
+        await db.rollback()
+        print_exc()
+        return 0
+
+async def query_wind_datas(db:AsyncSession, hid:int, is_horizon:bool, is_remained:bool=True):
+    try:
+        result = await db.scalars(select(Wdata).filter(Wdata.hid==hid, Wdata.is_horizon==is_horizon, Wdata.is_remained==is_remained).order_by(Wdata.time_point))
+        return result.all()
+    except:
+        print_exc()
+
+async def query_wind_data_combined(db:AsyncSession, hid:int, is_remained:bool=True):
+    try:
+        return await db.scalar(select(WDataCombined).filter(WDataCombined.hid==hid, WDataCombined.is_remained==is_remained).limit(1))
+    except:
+        print_exc()
+
+async def query_wind_data_combined_time_cols(db:AsyncSession, hid:int, is_remained:bool=True):
+    ''' 只查询已缓存的时间列表，不读取风场数据 '''
+    try:
+        return await db.scalar(select(WDataCombined.time_cols).filter(WDataCombined.hid==hid, WDataCombined.is_remained==is_remained).limit(1))
+    except:
+        print_exc()
+# endregion
+
+# region 压缩保存的风场数据
+async def query_wind_data_packed(db:AsyncSession, hid:int, is_remained:bool=True):
+    try:
+        return await db.scalar(select(WDataPacked).filter(WDataPacked.hid==hid, WDataPacked.is_remained==is_remained).limit(1))
+    except:
+        print_exc()
+
+async def add_wind_data_packed(db:AsyncSession, w_data_packed:WDataPacked, clear_combined:bool=True, commit:bool=True):
+    ''' 保存压缩后的风场数据，已存在时覆盖，同时删除已合并的TWindDataChunk
+    :param clear_combined:是否清空对应的TWindDataCombined中的JSON风场数据，只保留时间列表
+    '''
+    try:
+        await upsert(db, WDataPacked, to_row(w_data_packed), index_elements=['hid', 'is_remained'],
+            update_cols=['heights', 'time_cols', 'keys', 'dtype', 'data'], commit=False)
+        if clear_combined:
+            await db.execute(update(WDataCombined).filter(WDataCombined.hid==w_data_packed.hid, WDataCombined.is_remained==w_data_packed.is_remained).values({
+                WDataCombined.OriginHWS: {}, WDataCombined.HWS: {}, WDataCombined.HWD: {},
+                WDataCombined.OriginVWS: {}, WDataCombined.VWS: {}, WDataCombined.VWD: {},
+            }).execution_options(synchronize_session=False))
+        await db.execute(delete(WDataChunk).filter(WDataChunk.hid==w_data_packed.hid, WDataChunk.is_remained==w_data_packed.is_remained).execution_options(synchronize_session=False))
+        await commit_or_flush(db, commit)
+        return await query_wind_data_packed(db, hid=w_data_packed.hid, is_remained=w_data_packed.is_remained)
+    except Exception as e:
+        await db.rollback()
+        print_exc()
+
+async def add_wind_data_chunk(db:AsyncSession, w_data_chunk:WDataChunk, clear_combined:bool=False, commit:bool=True)->bool:
+    ''' 新增一批时间点的风场数据，同一批数据已存在时忽略
+    :param clear_combined:是否同时删除对应的TWindDataCombined（已转换为TWindDataChunk时）
+    :return bool 是否执行成功
+    '''
+    try:
+        await bulk_insert(db, WDataChunk, [to_row(w_data_chunk)], commit=False)
+        if clear_combined:
+            await db.execute(delete(WDataCombined).filter(WDataCombined.hid==w_data_chunk.hid, WDataCombined.is_remained==w_data_chunk.is_remained).execution_options(synchronize_session=False))
+        await commit_or_flush(db, commit)
+        return True
+    except Exception as e:
+        await db.rollback()
+        print_exc()
+        return False
+
+async def query_wind_data_chunks(db:AsyncSession, hid:int, is_remained:bool=True)->List[WDataChunk]:
+    try:
+        result = await db.scalars(select(WDataChunk).filter(WDataChunk.hid==hid, WDataChunk.is_remained==is_remained).order_by(WDataChunk.time_point))
+        return result.all()
+    except:
+        print_exc()
+
+async def query_wind_data_chunk_time_cols(db:AsyncSession, hid:int, is_remained:bool=True)->List[str]:
+    ''' 只查询已缓存的时间列表，不读取风场数据 '''
+    try:
+        result = await db.scalars(select(WDataChunk.time_cols).filter(WDataChunk.hid==hid, WDataChunk.is_remained==is_remained).order_by(WDataChunk.time_point))
+        return [time_col for time_cols in result.all() for time_col in time_cols]
+    except:
+        print_exc()
+        return []
+# endregion
@@ -1,25 +1,56 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from traceback import print_exc
-from typing import List
+from typing import List, Dict
 from datetime import date
 from .models import THeightData as Hdata
 from .models import TWindData as Wdata
 from .models import TWindDataCombined as WDataCombined
-from .database import Base, engine
+from .models import TWindDataPacked as WDataPacked
+from .models import TWindDataChunk as WDataChunk
+from .database import engine
+from .migrations import migrate
 from utils.common import js2str
 
-Base.metadata.create_all(bind=engine)
+migrate(engine)
+
+def commit_or_flush(db:Session, commit:bool=True)->None:
+    ''' commit为False时只发送到数据库，由调用方在同一个事务中统一提交 '''
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+
+def bulk_insert(db:Session, model, rows:List[dict], commit:bool=True)->int:
+    ''' 批量新增，一条INSERT ... ON CONFLICT DO NOTHING语句，违反唯一约束的行被忽略
+    :param model:ORM类
+    :param rows:每行数据的字典
+    :return int 提交的行数
+    '''
+    if len(rows) == 0:
+        return 0
+    db.execute(sqlite_insert(model).on_conflict_do_nothing(), rows)
+    commit_or_flush(db, commit)
+    return len(rows)
+
+def to_row(obj)->dict:
+    ''' ORM实例转换为INSERT语句的参数，值为None的列不传入，由列的默认值填充 '''
+    return {col.name: getattr(obj, col.key) for col in obj.__table__.columns if getattr(obj, col.key) is not None}
+
+def upsert(db:Session, model, row:dict, index_elements:list, update_cols:list, commit:bool=True)->None:
+    ''' 新增一行，index_elements对应的唯一索引冲突时只更新update_cols（INSERT ... ON CONFLICT DO UPDATE） '''
+    stmt = sqlite_insert(model).values(**row)
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_={col: stmt.excluded[col] for col in update_cols})
+    db.execute(stmt)
+    commit_or_flush(db, commit)
         
-def add_height_data(db:Session, h_data:Hdata):
-    try:
-        find_ = db.query(Hdata).filter(Hdata.station_code==h_data.station_code, Hdata.date==h_data.date).first()
-        if not find_:
-            db.add(h_data)
-            db.commit()
-            db.refresh(h_data)
-            return h_data
-        else:
-            return find_
+def add_height_data(db:Session, h_data:Hdata, commit:bool=True):
+    ''' 新增高度数据，同一站点、同一日期已存在时返回已有的数据 '''
+    try:
+        stmt = sqlite_insert(Hdata).values(**to_row(h_data)).on_conflict_do_nothing(index_elements=['station_code', 'date'])
+        db.execute(stmt)
+        commit_or_flush(db, commit)
+        return query_height_data(db, station_code=h_data.station_code, date_=h_data.date)
     except Exception as e:
         print_exc()
 
@@ -31,48 +62,54 @@ def query_height_data(db:Session, station_code:str, date_:date):
     except Exception as e:
         print_exc()
         
-def update_height_data(db:Session, h_data:Hdata):
+def update_height_data(db:Session, h_data:Hdata, commit:bool=True):
     try:
-        find_ = db.query(Hdata).filter(Hdata.date==h_data.date, Hdata.height_list==h_data.height_list).first()
-        # 更新h_data
-        if find_:
-            find_.finish_cached = h_data.finish_cached
-            db.commit()
-            return find_
+        # 按唯一索引(station_code, date)更新h_data
+        db.query(Hdata).filter(Hdata.station_code==h_data.station_code, Hdata.date==h_data.date).update({
+            Hdata.finish_cached: h_data.finish_cached,
+        }, synchronize_session=False)
+        commit_or_flush(db, commit)
+        return query_height_data(db, station_code=h_data.station_code, date_=h_data.date)
     except Exception as e:
         print_exc()
 
 
 def add_wind_data(db:Session, w_data:Wdata):
+    ''' 新增风场数据，同一时间点已存在时忽略 '''
+    try:
+        bulk_insert(db, Wdata, [to_row(w_data)])
+    except Exception as e:
+        db.rollback()
+        print_exc()
+
+def add_wind_datas(db:Session, w_datas:List[Wdata], commit:bool=True)->int:
+    ''' 批量新增风场数据，一条语句写入、一次提交，已存在的时间点由唯一索引跳过
+    :return int 提交的条数
+    '''
     try:
-        find_ = db.query(Wdata).filter(Wdata.hid==w_data.hid, Wdata.time_point==w_data.time_point,Wdata.is_horizon==w_data.is_horizon,Wdata.is_remained==w_data.is_remained).first()
-        if not find_:
-            db.add(w_data)
-            db.commit()
-            db.refresh(w_data)
-            return w_data
+        return bulk_insert(db, Wdata, [to_row(w_data) for w_data in w_datas], commit=commit)
     except Exception as e:
+        db.rollback()
         print_exc()
+        return 0
 
 def query_wind_datas(db:Session, hid:int, is_horizon:bool, is_remained:bool=True):
     try:
-        result = db.query(Wdata).filter(Wdata.hid==hid, Wdata.is_horizon==is_horizon, Wdata.is_remained==is_remained)
+        result = db.query(Wdata).filter(Wdata.hid==hid, Wdata.is_horizon==is_horizon, Wdata.is_remained==is_remained).order_by(Wdata.time_point)
         rows =  result.all()
         return rows
     except:
         print_exc()
         
 def add_wind_data_combined(db:Session, w_data_combined:WDataCombined):
+    ''' 新增合并后的风场数据，已存在时返回已有的数据 '''
     try:
-        find_ = db.query(WDataCombined).filter(WDataCombined.hid==w_data_combined.hid, WDataCombined.is_remained==w_data_combined.is_remained).first()
-        if not find_:
-            db.add(w_data_combined)
-            db.commit()
-            db.refresh(w_data_combined)
-            return w_data_combined
-        else:
-            return find_
+        stmt = sqlite_insert(WDataCombined).values(**to_row(w_data_combined)).on_conflict_do_nothing(index_elements=['hid', 'is_remained'])
+        db.execute(stmt)
+        db.commit()
+        return query_wind_data_combined(db, hid=w_data_combined.hid, is_remained=w_data_combined.is_remained)
     except Exception as e:
+        db.rollback()
         print_exc()
         
 def query_wind_data_combined(db:Session, hid:int, is_remained:bool=True):
@@ -82,25 +119,99 @@ def query_wind_data_combined(db:Session, hid:int, is_remained:bool=True):
     except:
         print_exc()
         
+def query_wind_data_combined_time_cols(db:Session, hid:int, is_remained:bool=True):
+    ''' 只查询已缓存的时间列表，不读取风场数据 '''
+    try:
+        result = db.query(WDataCombined.time_cols).filter(WDataCombined.hid==hid, WDataCombined.is_remained==is_remained).first()
+        if result:
+            return result.time_cols
+    except:
+        print_exc()
+        
 def update_wind_data_combined(db:Session, w_data_combined:WDataCombined):
+    ''' 更新合并后的风场数据，不存在时新增 '''
     try:
-        find_ = db.query(WDataCombined).filter(WDataCombined.hid==w_data_combined.hid, WDataCombined.is_remained==w_data_combined.is_remained).first()
-        # 更新w_data_combined
-        if find_:
-            find_.time_cols = w_data_combined.time_cols
-            
-            find_.OriginHWS = w_data_combined.OriginHWS
-            find_.HWS = w_data_combined.HWS
-            find_.HWD = w_data_combined.HWD
-            
-            find_.OriginVWS = w_data_combined.OriginVWS
-            find_.VWS = w_data_combined.VWS
-            find_.VWD = w_data_combined.VWD
-            db.commit()
-            return find_
-        else:
-            return add_wind_data_combined(db, w_data_combined)
+        upsert(db, WDataCombined, to_row(w_data_combined), index_elements=['hid', 'is_remained'],
+            update_cols=['time_cols', 'OriginHWS', 'HWS', 'HWD', 'OriginVWS', 'VWS', 'VWD'])
+        return query_wind_data_combined(db, hid=w_data_combined.hid, is_remained=w_data_combined.is_remained)
     except Exception as e:
+        db.rollback()
+        print_exc()
+
+def query_wind_data_packed(db:Session, hid:int, is_remained:bool=True):
+    try:
+        result = db.query(WDataPacked).filter(WDataPacked.hid==hid, WDataPacked.is_remained==is_remained).first()
+        return result
+    except:
         print_exc()
 
-        
\ No newline at end of file
+def add_wind_data_packed(db:Session, w_data_packed:WDataPacked, clear_combined:bool=True, commit:bool=True):
+    ''' 保存压缩后的风场数据，已存在时覆盖，同时删除已合并的TWindDataChunk
+    :param clear_combined:是否清空对应的TWindDataCombined中的JSON风场数据，只保留时间列表
+    '''
+    try:
+        upsert(db, WDataPacked, to_row(w_data_packed), index_elements=['hid', 'is_remained'],
+            update_cols=['heights', 'time_cols', 'keys', 'dtype', 'data'], commit=False)
+        if clear_combined:
+            db.query(WDataCombined).filter(WDataCombined.hid==w_data_packed.hid, WDataCombined.is_remained==w_data_packed.is_remained).update({
+                WDataCombined.OriginHWS: {}, WDataCombined.HWS: {}, WDataCombined.HWD: {},
+                WDataCombined.OriginVWS: {}, WDataCombined.VWS: {}, WDataCombined.VWD: {},
+            }, synchronize_session=False)
+        db.query(WDataChunk).filter(WDataChunk.hid==w_data_packed.hid, WDataChunk.is_remained==w_data_packed.is_remained).delete(synchronize_session=False)
+        commit_or_flush(db, commit)
+        return query_wind_data_packed(db, hid=w_data_packed.hid, is_remained=w_data_packed.is_remained)
+    except Exception as e:
+        db.rollback()
+        print_exc()
+
+def query_unpacked_wind_data_combined_ids(db:Session)->List[int]:
+    ''' 查询缓存已完成、但风场数据仍以JSON保存的TWindDataCombined的id '''
+    try:
+        packed = db.query(WDataPacked.id).filter(WDataPacked.hid==WDataCombined.hid, WDataPacked.is_remained==WDataCombined.is_remained).exists()
+        result = db.query(WDataCombined.id).join(Hdata, Hdata.id==WDataCombined.hid).filter(Hdata.finish_cached==True, ~packed)
+        return [row.id for row in result.all()]
+    except:
+        print_exc()
+        return []
+
+def query_wind_data_combined_by_id(db:Session, id:int):
+    try:
+        return db.query(WDataCombined).filter(WDataCombined.id==id).first()
+    except:
+        print_exc()
+
+def add_wind_data_chunk(db:Session, w_data_chunk:WDataChunk, clear_combined:bool=False, commit:bool=True)->bool:
+    ''' 新增一批时间点的风场数据，只写入新增的部分，同一批数据已存在时忽略
+    :param clear_combined:是否同时删除对应的TWindDataCombined（已转换为TWindDataChunk时）
+    :return bool 是否执行成功
+    '''
+    try:
+        bulk_insert(db, WDataChunk, [{
+            'hid': w_data_chunk.hid, 'is_remained': w_data_chunk.is_remained, 'time_point': w_data_chunk.time_point,
+            'time_cols': w_data_chunk.time_cols, 'dtype': w_data_chunk.dtype, 'data': w_data_chunk.data,
+        }], commit=False)
+        if clear_combined:
+            db.query(WDataCombined).filter(WDataCombined.hid==w_data_chunk.hid, WDataCombined.is_remained==w_data_chunk.is_remained).delete(synchronize_session=False)
+        commit_or_flush(db, commit)
+        return True
+    except Exception as e:
+        db.rollback()
+        print_exc()
+        return False
+
+def query_wind_data_chunks(db:Session, hid:int, is_remained:bool=True)->List[WDataChunk]:
+    try:
+        result = db.query(WDataChunk).filter(WDataChunk.hid==hid, WDataChunk.is_remained==is_remained).order_by(WDataChunk.time_point)
+        return result.all()
+    except:
+        print_exc()
+        return []
+
+def query_wind_data_chunk_time_cols(db:Session, hid:int, is_remained:bool=True)->List[str]:
+    ''' 只查询已缓存的时间列表，不读取风场数据 '''
+    try:
+        result = db.query(WDataChunk.time_cols).filter(WDataChunk.hid==hid, WDataChunk.is_remained==is_remained)
+        return [time_col for row in result.all() for time_col in row.time_cols]
+    except:
+        print_exc()
+        return []
@@ -1,10 +1,16 @@
 from utils.database import get_sqlite_engine,get_local_session,get_engine_base
+from utils.database import get_async_sqlite_engine,get_async_local_session
 from utils.config_manager import webConfig
 
 DB_NAME = 'wpr'
-URL = webConfig.sqlite_db[DB_NAME]['url']
-engine = get_sqlite_engine(URL, echo=webConfig.config['sqlalchemy']['echo'])
+DB_CONFIG = webConfig.sqlite_db[DB_NAME]
+URL = DB_CONFIG['url']
+engine = get_sqlite_engine(URL, echo=webConfig.config['sqlalchemy']['echo'], pragmas=DB_CONFIG.get('pragmas'), pool_config=DB_CONFIG.get('pool'))
 
 Base = get_engine_base(db_name=DB_NAME, name=f'{DB_NAME}Base')
 
-SessionLocal = get_local_session(engine=engine)
\ No newline at end of file
+SessionLocal = get_local_session(engine=engine)
+
+# 异步引擎与会话，见async_crud
+async_engine = get_async_sqlite_engine(URL, echo=webConfig.config['sqlalchemy']['echo'], pragmas=DB_CONFIG.get('pragmas'))
+AsyncSessionLocal = get_async_local_session(engine=async_engine)
@@ -0,0 +1,87 @@
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.engine import Connection
+from .database import Base
+from .models import THeightData as Hdata
+from .models import TWindData as Wdata
+from .models import TWindDataCombined as WDataCombined
+
+# 依赖height_data.id的表，删除重复的高度数据时一起删除
+CHILD_TABLES = ['wind_data', 'wind_data_combined', 'wind_data_packed', 'wind_data_chunk']
+
+def get_user_version(conn:Connection)->int:
+    ''' 数据库结构的版本号，保存在SQLite的PRAGMA user_version中，新建的数据库为0 '''
+    return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+def set_user_version(conn:Connection, version:int)->None:
+    conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+def delete_duplicates(conn:Connection, table:str, keys:list)->int:
+    ''' 删除keys相同的重复行，只保留id最小的一行
+    :return int 删除的行数
+    '''
+    keys = ', '.join(keys)
+    result = conn.execute(text(f'DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {keys})'))
+    return result.rowcount
+
+def has_unique_index(conn:Connection, table:str, columns:list)->bool:
+    ''' 表中是否存在只包含columns的唯一索引（包括建表时的UNIQUE约束） '''
+    for index in conn.exec_driver_sql(f"PRAGMA index_list('{table}')").all():
+        if index.unique and [col.name for col in conn.exec_driver_sql(f"PRAGMA index_info('{index.name}')").all()] == columns:
+            return True
+    return False
+
+def rebuild_table(conn:Connection, table)->None:
+    ''' 按当前的ORM定义重建表并复制数据，SQLite不支持删除已有的约束 '''
+    old_name = f'{table.name}_old'
+    columns = ', '.join(col.name for col in table.columns)
+    conn.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO {old_name}')
+    for index in table.indexes: # 索引名称是全局的，先删除旧表上的同名索引
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {index.name}')
+    table.create(conn)
+    conn.exec_driver_sql(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}')
+    conn.exec_driver_sql(f'DROP TABLE {old_name}')
+
+# region 迁移步骤
+def migrate_v1(conn:Connection)->None:
+    ''' 为常用的查询条件创建唯一索引，重复的数据先删除；wind_data_combined的hid不再单独唯一 '''
+    duplicated = f'SELECT id FROM height_data WHERE id NOT IN (SELECT MIN(id) FROM height_data GROUP BY station_code, date)'
+    for table in CHILD_TABLES:
+        conn.execute(text(f'DELETE FROM {table} WHERE hid IN ({duplicated})'))
+    delete_duplicates(conn, 'height_data', ['station_code', 'date'])
+    delete_duplicates(conn, 'wind_data', ['hid', 'is_horizon', 'is_remained', 'time_point'])
+    delete_duplicates(conn, 'wind_data_combined', ['hid', 'is_remained'])
+
+    if has_unique_index(conn, WDataCombined.__tablename__, ['hid']):
+        rebuild_table(conn, WDataCombined.__table__)
+    for model in [Hdata, Wdata, WDataCombined]:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+# endregion
+
+MIGRATIONS = [
+    (1, migrate_v1),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(engine:Engine)->int:
+    ''' 创建缺少的表，并按版本号依次执行未执行过的迁移步骤，每个步骤在单独的事务中执行
+    :return int 迁移后的版本号
+    '''
+    with engine.begin() as conn:
+        if get_user_version(conn) == 0 and not inspect(conn).has_table(Hdata.__tablename__):
+            # 新的数据库直接按当前的ORM定义建表
+            Base.metadata.create_all(bind=conn)
+            set_user_version(conn, SCHEMA_VERSION)
+            return SCHEMA_VERSION
+        Base.metadata.create_all(bind=conn) # 只创建缺少的表，已有表的索引由迁移步骤创建
+        version = get_user_version(conn)
+
+    for target, step in MIGRATIONS:
+        if target <= version:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            set_user_version(conn, target)
+        print(f'数据库已迁移到版本{target}')
+        version = target
+    return version
@@ -1,9 +1,10 @@
-from sqlalchemy import Column, String, Integer, Date, JSON, ForeignKey, Boolean, DateTime, func
+from sqlalchemy import Column, String, Integer, Date, JSON, ForeignKey, Boolean, DateTime, LargeBinary, UniqueConstraint, Index, func
 from sqlalchemy.orm import relationship
 from .database import Base
     
 class THeightData(Base):
     __tablename__ = 'height_data'
+    __table_args__ = (Index('uix_height_data_station_code_date', 'station_code', 'date', unique=True),)
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     station_code = Column(String(20), nullable=False, comment='站点编码')
@@ -20,6 +21,7 @@ class THeightData(Base):
     
 class TWindData(Base):
     __tablename__ = 'wind_data'
+    __table_args__ = (Index('uix_wind_data_hid_is_horizon_is_remained_time_point', 'hid', 'is_horizon', 'is_remained', 'time_point', unique=True),)
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     hid = Column(Integer, ForeignKey('height_data.id'), nullable=False) # 关联THeightData的Id，外键
@@ -38,8 +40,9 @@ class TWindData(Base):
     
 class TWindDataCombined(Base):
     __tablename__ = 'wind_data_combined'
+    __table_args__ = (Index('uix_wind_data_combined_hid_is_remained', 'hid', 'is_remained', unique=True),)
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    hid = Column(Integer, ForeignKey('height_data.id'), nullable=False,unique=True) # 关联THeightData的Id，外键
+    hid = Column(Integer, ForeignKey('height_data.id'), nullable=False) # 关联THeightData的Id，外键
     height_data = relationship('THeightData', backref='wind_data_combined')
     is_remained = Column(Boolean, default=True, comment='是否保留特定高度的风场数据')
     
@@ -54,4 +57,38 @@ class TWindDataCombined(Base):
     VWD = Column(JSON, default={}, nullable=False, comment='垂直风向数据列表')
     
     create_time = Column(DateTime, server_default=func.now(), comment='创建时间')
-    soft_deleted = Column(Boolean, default=False, nullable=False, comment='软删除')
\ No newline at end of file
+    soft_deleted = Column(Boolean, default=False, nullable=False, comment='软删除')
+
+class TWindDataPacked(Base):
+    ''' 缓存完成的风场数据，6个 高度×时间 矩阵按WIND_FIELD_KEYS的顺序压缩保存为一个二进制数据，缺测为NaN '''
+    __tablename__ = 'wind_data_packed'
+    __table_args__ = (UniqueConstraint('hid', 'is_remained'),)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    hid = Column(Integer, ForeignKey('height_data.id'), nullable=False) # 关联THeightData的Id，外键
+    height_data = relationship('THeightData', backref='wind_data_packed')
+    is_remained = Column(Boolean, default=True, comment='是否保留特定高度的风场数据')
+    
+    heights = Column(JSON, nullable=False, comment='高度列表，与矩阵的行对应')
+    time_cols = Column(JSON, nullable=False, comment='时间列表，与矩阵的列对应')
+    keys = Column(JSON, nullable=False, comment='矩阵名称列表，与数据的存放顺序一致')
+    dtype = Column(String(10), default='float32', nullable=False, comment='矩阵的数据类型')
+    data = Column(LargeBinary, nullable=False, comment='zlib压缩后的风场矩阵')
+    
+    create_time = Column(DateTime, server_default=func.now(), comment='创建时间')
+    soft_deleted = Column(Boolean, default=False, nullable=False, comment='软删除')
+
+class TWindDataChunk(Base):
+    ''' 缓存未完成的风场数据，每次新增的时间点保存为一行，格式与TWindDataPacked相同，缓存完成后合并为TWindDataPacked '''
+    __tablename__ = 'wind_data_chunk'
+    __table_args__ = (UniqueConstraint('hid', 'is_remained', 'time_point'),)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    hid = Column(Integer, ForeignKey('height_data.id'), nullable=False) # 关联THeightData的Id，外键
+    height_data = relationship('THeightData', backref='wind_data_chunk')
+    is_remained = Column(Boolean, default=True, comment='是否保留特定高度的风场数据')
+    
+    time_point = Column(DateTime, nullable=False, comment='第一个时间点')
+    time_cols = Column(JSON, nullable=False, comment='时间列表，与矩阵的列对应')
+    dtype = Column(String(10), default='float32', nullable=False, comment='矩阵的数据类型')
+    data = Column(LargeBinary, nullable=False, comment='zlib压缩后的风场矩阵，行与THeightData的高度列表对应')
+    
+    create_time = Column(DateTime, server_default=func.now(), comment='创建时间')
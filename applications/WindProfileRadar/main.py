@@ -1,56 +1,138 @@
 from fastapi import APIRouter,Query
 from typing import List
+import asyncio
 import datetime
 import os
-import gc
 import platform
 import pandas as pd
-from starlette.responses import FileResponse
-from starlette.background import BackgroundTask
-from concurrent.futures import ThreadPoolExecutor
+from starlette.responses import Response
+from starlette.concurrency import run_in_threadpool
 
 # custom
-from .data_helper import get_heapmap, get_heat_map_from_wdc
-from .plt_helper import Plotter
+from .data_helper import get_heapmap, get_heat_map_from_wdc, async_get_wpr_fetch_window, async_get_cached_heat_map, wind_field_pool
+from .data_helper.schemas import WPR_DataType
+from .plt_helper import Plotter, render_pool
+from .plt_helper.configs import HeatMapConfig, ImageFormat, ImageSize
+from .plt_helper.render_cache import render_cache, get_render_cache_key, load_rendered_image, save_rendered_image
+from .data_helper.heatmap_cache import heatmap_cache
 import api
-from utils.common import TimeStr, get_time_str, get_random_str, concatenate_images_vertically
+from utils.common import TimeStr, get_time_str, image_to_bytes
+from utils.singleflight import SingleFlight
 
 if platform.system()=='Linux':
     os.environ["TZ"] = "Asia/Shanghai"
 router = APIRouter()
 
-SAVEDIR = 'static/wpr'
-if not os.path.exists(SAVEDIR):os.makedirs(SAVEDIR)
-
-def cache_clear(*file_paths)->None:
-    ''' 清除缓存文件 '''
-    for path in file_paths:
-        if os.path.exists(path):
-            os.remove(path)
-    gc.collect()# 清理内存
-
-def get_wpr_img(
-    date:datetime.date|None|str=None,
+@router.on_event('startup')
+def start_wind_field_pool():
+    wind_field_pool.start() # 启动常驻的风场矩阵计算进程池
+
+@router.on_event('shutdown')
+def shutdown_wind_field_pool():
+    wind_field_pool.shutdown()
+
+@router.on_event('startup')
+def start_render_pool():
+    render_pool.start() # 启动常驻的绘图进程池
+
+@router.on_event('shutdown')
+def shutdown_render_pool():
+    render_pool.shutdown()
+
+# 合并并发的相同请求，避免重复请求外部接口、重复写入数据库和重复绘图
+heatmap_flight = SingleFlight()
+img_flight = SingleFlight()
+
+async def get_wpr_heatmap(wpr_code:str, start_time_str:str, end_time_str:str, drawSpeLayerArrow:bool=True):
+    ''' 获取风廓线雷达热力图数据，同一站点同一时间范围的并发请求只处理一次 '''
+    async def load():
+        # 已经缓存完成并压缩保存的数据直接在事件循环中读取
+        heatmap_data = await async_get_cached_heat_map(wpr_code, start_time_str, end_time_str, drawSpeLayerArrow)
+        if heatmap_data is not None:
+            return heatmap_data
+        # 已经缓存完成的风廓线雷达数据不再请求
+        wpr_window = await async_get_wpr_fetch_window(wpr_code, start_time_str, end_time_str, drawSpeLayerArrow)
+        wpr_data = None
+        if wpr_window is not None:
+            wpr_data = await api.async_get_WPR_frame(wpr_code, *wpr_window, WPR_DataType.get_require_dtypes())
+        return await run_in_threadpool(
+            get_heat_map_from_wdc,
+            station_code=wpr_code, start_time=start_time_str, end_time=end_time_str, drawSpeLayerArrow=drawSpeLayerArrow,
+            wpr_data=wpr_data,
+        )
+    return await heatmap_flight.do((wpr_code, start_time_str, end_time_str, drawSpeLayerArrow), load)
+
+async def get_wpr_img(
+    start_time_str:str,
+    end_time_str:str,
     wpr_code:str='H0001',
     sitenames:List[str]=[],
     station_codes:List[str]=[],
-):
-    pass
+    plotter:Plotter=None,
+    format:ImageFormat=ImageFormat.PNG,
+    regenerate:bool=False,
+    finished:bool=True,
+)->bytes:
+    ''' 获取数据并绘制风廓线雷达图，按数据和绘图参数缓存绘制好的图片
+    :param format:图片格式，分辨率由plotter.config.dpi决定
+    :param regenerate:是否忽略已缓存的图片，重新绘制
+    :param finished:时间范围是否已经结束，未结束的图片缓存有效期较短
+    :return bytes 图片内容
+    '''
+    if plotter is None:
+        plotter = Plotter()
+    # region 获取数据与处理数据，并发请求所有外部接口
+    site_datas, heatmap_data = await asyncio.gather(
+        api.async_get_AQ_datas(station_codes, start_time_str, end_time_str),
+        get_wpr_heatmap(wpr_code, start_time_str, end_time_str, drawSpeLayerArrow=True),
+    )
+    # endregion
+    
+    # 缓存键包含数据版本，数据变化后不会读到旧的图片
+    cache_key = await run_in_threadpool(get_render_cache_key, heatmap_data, site_datas, sitenames, plotter.config, True, format)
+    if not regenerate:
+        content = await run_in_threadpool(load_rendered_image, cache_key)
+        if content is not None:
+            return content
+
+    # region 绘制图片，各张图在内存中拼接为一张图，只编码一次
+    content = await run_in_threadpool(plotter.render, heatmap_data=heatmap_data,site_datas=site_datas,sitenames=sitenames,use_en=True,format=format)
+    # endregion
+
+    await run_in_threadpool(save_rendered_image, cache_key, content, finished)
+    return content
+
+def get_image_dpi(size:ImageSize=ImageSize.FULL, dpi:int|None=None, width:int|None=None, figsize:tuple=HeatMapConfig().figsize)->int:
+    ''' 确定绘图分辨率，优先级：width > dpi > size
+    :param width:图片宽度（像素），按每张图的宽度figsize[0]换算为分辨率
+    :return int 分辨率
+    '''
+    if width is not None:
+        return max(1, round(width / figsize[0]))
+    if dpi is not None:
+        return dpi
+    return size.dpi
 
 @router.get('/Img')
-def get_WPR_img_interface(
+async def get_WPR_img_interface(
     date:datetime.date|None|str=Query(default=None,description='日期'),
     wpr_code:str=Query('H0001',description='风廓线雷达站点编号'), 
     sitenames:List[str]= Query(['ShiLing','SuGang'], description='与编号对应的国控点名称'), 
     station_codes:List[str]=Query(["440600455",'440600405'], description='国控点编号'),
     regenerate:bool=Query(default=False,description='是否重新生成图片'),
+    format:ImageFormat=Query(default=ImageFormat.PNG,description='图片格式'),
+    size:ImageSize=Query(default=ImageSize.FULL,description='图片尺寸档位：thumb(288px)、small(576px)、medium(960px)、full(1800px)'),
+    dpi:int|None=Query(default=None,ge=24,le=300,description='分辨率，设置时忽略size'),
+    width:int|None=Query(default=None,ge=144,le=1800,description='图片宽度（像素），设置时忽略size和dpi'),
 ):
-    ''' 从数据库中获取数据，并绘制风廓线雷达图 '''
+    ''' 从数据库中获取数据，并绘制风廓线雷达图
+    
+    低分辨率的档位按对应的分辨率直接绘制，不同格式、分辨率、站点的图片分别缓存
+    '''
 
-    # 用于判断是否执行缓存
-    exec_cache = True
+    # 时间范围是否已经结束
+    finished = True
 
-    # region 获取数据与处理数据
     if date is None:
         date = datetime.date.today()
     date_str = datetime.datetime.strptime(date, TimeStr.Ymd.value).strftime(TimeStr.Ymd.value) if isinstance(date, str) else get_time_str(date, TimeStr.Ymd)
@@ -58,43 +140,36 @@ def get_WPR_img_interface(
     start_time_str = f'{date_str} 0:0:0'
     end_time_str = f'{date_str} 23:0:0'
     end_time = pd.to_datetime(end_time_str)
+    dpi = get_image_dpi(size, dpi, width)
+    # 下载时的文件名，原图保持原来的文件名，其他分辨率加上分辨率后缀
+    tier = '' if dpi == ImageSize.FULL.dpi else f'_{dpi}dpi'
+    filename = f'{wpr_code}_{date_str}{tier}.{format.suffix}'
     
-    if end_time > (now:=datetime.datetime.now()): # 结束时间大于当前时间，说明当天还没结束，需要重新画一张图
+    if end_time > (now:=datetime.datetime.now()): # 结束时间大于当前时间，说明当天还没结束，数据还会更新
         end_time_str = get_time_str(now+datetime.timedelta(hours=1), TimeStr.YmdH00)
-        savepath = f'{SAVEDIR}/{wpr_code}_{date_str}_{get_random_str()}.png'
-        exec_cache = False
-    else:
-        savepath = f'{SAVEDIR}/{wpr_code}_{date_str}.png'
-        if os.path.exists(savepath) and not regenerate:
-            return FileResponse(savepath,filename=f'{wpr_code}_{date_str}.png')
-
-    site_datas = []
-    with ThreadPoolExecutor() as pool:
-        futures = []
-        for code in station_codes:
-            futures.append(pool.submit(api.get_AQ_data,code,start_time_str, end_time_str))
-        for f in futures:
-            site_datas.append(f.result())
-
-    heatmap_data = get_heat_map_from_wdc(station_code=wpr_code, start_time=start_time_str, end_time=end_time_str, drawSpeLayerArrow=True)
-    # endregion
-    
-    # region 绘制图片
-    plotter = Plotter()
-    cached_imgs = plotter.draw(heatmap_data=heatmap_data,site_datas=site_datas,sitenames=sitenames,use_en=True)
-    # endregion
-
-    # 将这些图片合并为一张图后返回
-    concatenate_images_vertically(cached_imgs, savepath)
-
-    if not exec_cache:# 如果不缓存，则删除缓存文件
-        cached_imgs.append(savepath)
-
-    return FileResponse(
-        savepath,
-        filename=f'{wpr_code}_{date_str}.png',
-        background=BackgroundTask(lambda:(cache_clear(*cached_imgs)))
+        finished = False
+
+    plotter = Plotter(HeatMapConfig(dpi=dpi))
+    key = (wpr_code, start_time_str, end_time_str, tuple(station_codes), tuple(sitenames), regenerate, format, plotter.config.model_dump_json())
+    content = await img_flight.do(key, lambda: get_wpr_img(
+        start_time_str, end_time_str, wpr_code=wpr_code,
+        sitenames=sitenames, station_codes=station_codes, plotter=plotter, format=format,
+        regenerate=regenerate, finished=finished,
+    ))
+
+    return Response(
+        content=content,
+        media_type=format.media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
     )
+
+@router.get('/CacheStats')
+def get_cache_stats():
+    ''' 图片缓存和热力图数据缓存的命中统计 '''
+    return {
+        'render_cache': render_cache.stats(),
+        'heatmap_cache': heatmap_cache.stats(),
+    }
     
 @router.get('/Img1',deprecated=True)
 def get_WPR_img(
@@ -108,34 +183,25 @@ def get_WPR_img(
     if date is None:
         date = datetime.date.today()
     date_str = date if isinstance(date, str) else get_time_str(date, TimeStr.Ymd)
-    savepath = f'{SAVEDIR}/{wpr_code}_{date_str}_{get_random_str()}.png'
     start_time_str = f'{date_str} 0:0:0'
     end_time_str = f'{date_str} 23:0:0'
     end_time = pd.to_datetime(end_time_str)
     if end_time > (now:=datetime.datetime.now()):
         end_time_str = get_time_str(now+datetime.timedelta(hours=1), TimeStr.YmdH00)
 
-    site_datas = []
-    with ThreadPoolExecutor() as pool:
-        futures = []
-        for code in station_codes:
-            futures.append(pool.submit(api.get_AQ_data,code,start_time_str, end_time_str))
-        for f in futures:
-            site_datas.append(f.result())
+    site_datas = api.get_AQ_datas(station_codes, start_time_str, end_time_str)
 
     heatmap_data = get_heapmap(station_code=wpr_code, start_time=start_time_str, end_time=end_time_str)
     # endregion
     
     # region 绘制图片
     plotter = Plotter()
-    results = plotter.draw(heatmap_data=heatmap_data,site_datas=site_datas,sitenames=sitenames,use_en=True)
+    image = plotter.draw_composite(heatmap_data=heatmap_data,site_datas=site_datas,sitenames=sitenames,use_en=True)
     # endregion
 
-    # 将这些图片合并为一张图后返回
-    concatenate_images_vertically(results, savepath)
-    return FileResponse(
-        savepath,
-        filename=f'{wpr_code}_{date_str}.png',
-        # background=BackgroundTask(lambda:(os.remove(savepath)))
-        background=BackgroundTask(lambda:([os.remove(r) for r in results],gc.collect()))
+    # 合并后的图片在内存中编码后返回
+    return Response(
+        content=image_to_bytes(image),
+        media_type='image/png',
+        headers={'Content-Disposition': f'attachment; filename="{wpr_code}_{date_str}.png"'},
     )
\ No newline at end of file
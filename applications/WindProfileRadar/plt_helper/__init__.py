@@ -1 +1,2 @@
-from .plotter import Plotter
\ No newline at end of file
+from .plotter import Plotter
+from .workers import render_pool
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -11,6 +11,7 @@ class HeatMapConfig(BaseModel):
     - time_str_type:标题上的时间格式
     - position:图片的位置，[x0,y0,width,height]
     - drawSpeLayerArrow:是否只画指定高度的风场
+    - engine:热力图绘制方式，'seaborn'或'matplotlib'（直接用pcolormesh绘制，不创建每个高度、每个时间的刻度，速度更快）
     - cHeadMap:热力图颜色序列
     - arrowWidth:折线图中风场箭头的箭杆宽度
     - arrowHeadWidth:折线图中箭头相对于箭杆宽度的倍数
@@ -49,6 +50,7 @@ class HeatMapConfig(BaseModel):
     figsize: tuple = Field(default=(6,2), description='图片大小')
     dpi: int = Field(default=300, description='图片分辨率')
     drawSpeLayerArrow: bool = Field(default=True, description='是否只画指定高度的风场')
+    engine: Literal['seaborn', 'matplotlib'] = Field(default='matplotlib', description='热力图绘制方式')
     cHeadMap: str = Field(default='jet', description='热力图颜色序列')
     arrowWidth: float = Field(default=0.004, description='折线图中风场箭头的箭杆宽度')
     arrowHeadWidth: int = Field(default=4, description='折线图中箭头相对于箭杆宽度的倍数')
@@ -112,4 +114,47 @@ class TargetPollutants(Enum):
     PM10 = PolluntantPlot(annotation=Pollutants.PM10, marker='d', color='red')
     NO2 = PolluntantPlot(annotation=Pollutants.NO2, marker='o', color='blue',linestyle='-')
     PM25 = PolluntantPlot(annotation=Pollutants.PM25, marker='H', color='blue')
-    SO2 = PolluntantPlot(annotation=Pollutants.SO2, marker='s', color='green')
\ No newline at end of file
+    SO2 = PolluntantPlot(annotation=Pollutants.SO2, marker='s', color='green')
+
+class ImageFormat(str, Enum):
+    ''' 输出图片格式，SVG为矢量图，其余为位图 '''
+    PNG = 'png'
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    SVG = 'svg'
+
+    @property
+    def media_type(self)->str:
+        return 'image/svg+xml' if self == ImageFormat.SVG else f'image/{self.value}'
+
+    @property
+    def suffix(self)->str:
+        ''' 文件扩展名 '''
+        return 'jpg' if self == ImageFormat.JPEG else self.value
+
+    @property
+    def is_vector(self)->bool:
+        return self == ImageFormat.SVG
+
+class ImageSize(str, Enum):
+    ''' 输出图片尺寸档位，按对应的分辨率直接绘制，不从高分辨率的图片缩小；每张图的宽度为figsize[0]×dpi像素
+    - thumb:缩略图，48dpi，宽288像素
+    - small:96dpi，宽576像素
+    - medium:160dpi，宽960像素
+    - full:原图，300dpi，宽1800像素
+    '''
+    THUMB = 'thumb'
+    SMALL = 'small'
+    MEDIUM = 'medium'
+    FULL = 'full'
+
+    @property
+    def dpi(self)->int:
+        return IMAGE_SIZE_DPI[self]
+
+IMAGE_SIZE_DPI = {
+    ImageSize.THUMB: 48,
+    ImageSize.SMALL: 96,
+    ImageSize.MEDIUM: 160,
+    ImageSize.FULL: 300,
+}
@@ -1,18 +1,27 @@
-from concurrent.futures import ThreadPoolExecutor
 from typing import List
+from PIL import Image
+import numpy as np
 import os
 
 from ..data_helper.utils import get_pollutant_max
 from ..data_helper.models import HeatMapData
 from ..data_helper.schemas import WindFieldDataType
-from .configs import HeatMapConfig
+from .configs import HeatMapConfig, ImageFormat
 from .utils import draw_wind_field_heat_map, draw_pollutant_plot
-from utils.common import get_time_str, TimeStr
+from .workers import render_pool
+from utils.common import get_time_str, TimeStr, image_to_bytes, concatenate_svgs_vertically
 
 BaseDir = "static/tmp"
 if not os.path.exists(BaseDir):
     os.makedirs(BaseDir)
 
+# 位图的编码参数
+ENCODE_PARAMS = {
+    ImageFormat.PNG: {},
+    ImageFormat.WEBP: {"quality": 85, "method": 4},
+    ImageFormat.JPEG: {"quality": 85, "optimize": True},
+}
+
 
 class Plotter:
     def __init__(self, config: HeatMapConfig = HeatMapConfig()):
@@ -26,7 +35,7 @@ class Plotter:
         use_en: bool = True,
         base_dir=BaseDir,
     ) -> List[str]:
-        """绘制风廓线雷达图
+        """绘制风廓线雷达图，每张图分别保存
 
         参数：
         - heatmap_data: 热力图数据
@@ -38,47 +47,119 @@ class Plotter:
         返回：
         - 图片保存路径列表
         """
-        results = []
-        # region init
         time_str = f"{get_time_str(heatmap_data.start_time,TimeStr.YmdHMS_Na)}--{get_time_str(heatmap_data.end_time,TimeStr.YmdHMS_Na)}"
+        savepaths = [f"{base_dir}/{heatmap_data.station_code}-{time_str}--{dt.value.col_name}.png" for dt in WindFieldDataType]
+        savepaths += [f"{base_dir}/{heatmap_data.station_code}-{time_str}--{sitenames[idx]}.png" for idx in range(len(site_datas))]
+        return self.draw_panels(heatmap_data, site_datas, sitenames, use_en, savepaths)
+
+    def draw_composite(
+        self,
+        heatmap_data: HeatMapData,
+        site_datas,
+        sitenames,
+        use_en: bool = True,
+    ) -> Image.Image:
+        """绘制风廓线雷达图，各张图的像素直接竖向拼接为一张图，不保存中间图片
+
+        参数：
+        - heatmap_data: 热力图数据
+        - site_datas: 站点污染物浓度数据
+        - sitenames:站点名称
+        - use_en:是否使用英文
+
+        返回：
+        - 拼接后的图片，与concatenate_images_vertically拼接各张图片的结果一致
+        """
+        panels = self.draw_panels(heatmap_data, site_datas, sitenames, use_en)
+        return Image.fromarray(np.concatenate(panels, axis=0), mode="RGB")
+
+    def render(
+        self,
+        heatmap_data: HeatMapData,
+        site_datas,
+        sitenames,
+        use_en: bool = True,
+        format: ImageFormat = ImageFormat.PNG,
+    ) -> bytes:
+        """绘制风廓线雷达图并编码为指定格式，按self.config.dpi直接绘制
+
+        参数：
+        - heatmap_data: 热力图数据
+        - site_datas: 站点污染物浓度数据
+        - sitenames:站点名称
+        - use_en:是否使用英文
+        - format:图片格式，SVG时各张图导出为矢量图后拼接
+
+        返回：
+        - 编码后的图片内容
+        """
+        if format.is_vector:
+            panels = self.draw_panels(heatmap_data, site_datas, sitenames, use_en, format=format.value)
+            return concatenate_svgs_vertically(panels)
+        image = self.draw_composite(heatmap_data, site_datas, sitenames, use_en)
+        return image_to_bytes(image, format=format.value.upper(), **ENCODE_PARAMS[format])
+
+    def draw_panels(
+        self,
+        heatmap_data: HeatMapData,
+        site_datas,
+        sitenames,
+        use_en: bool = True,
+        savepaths: List[str] | None = None,
+        format: str = None,
+    ) -> list:
+        """依次绘制风场热力图和各站点的污染物浓度折线图，绘图进程池已启动时并行绘制
+
+        参数：
+        - savepaths:各张图的保存路径，为None时不保存
+        - format:不保存时的导出格式，为'svg'时返回SVG内容
+
+        返回：
+        - 图片保存路径列表；savepaths为None时返回各张图的RGB像素数组或SVG内容
+        """
+        # region init
         left_max, right_max, SO2_max = get_pollutant_max(site_datas)
         # endregion
         
         last_time:str = heatmap_data.get_last_time()
         last_hour:int = heatmap_data.get_last_hour()
 
-        for _, dt in WindFieldDataType.__members__.items():
-            savepath = f"{base_dir}/{heatmap_data.station_code}-{time_str}--{dt.value.col_name}.png"
-            # TODO 用了seaborn的热力图，无法用多线程绘图
+        if savepaths is None:
+            savepaths = [None] * (len(WindFieldDataType) + len(site_datas))
+        heat_map_paths = savepaths[:len(WindFieldDataType)]
+        pollutant_paths = savepaths[len(WindFieldDataType):]
+
+        if render_pool.started:
+            # 所有图片同时提交给绘图进程池，在不同的进程中并行绘制
+            futures = [
+                render_pool.draw_heat_map(savepath, dt, heatmap_data, self.config, use_en, last_time=last_time, last_hour=last_hour, format=format)
+                for savepath, dt in zip(heat_map_paths, WindFieldDataType)
+            ]
+            for idx, site_data in enumerate(site_datas):
+                futures.append(render_pool.draw_pollutant_plot(
+                    pollutant_paths[idx], sitenames[idx], site_data, left_max, right_max, SO2_max, self.config, use_en,
+                    last_time=last_time, last_hour=last_hour, format=format,
+                ))
+            return [future.result() for future in futures]
+
+        # 未启动绘图进程池时在当前线程中依次绘制，pyplot不是线程安全的
+        results = []
+        for savepath, dt in zip(heat_map_paths, WindFieldDataType):
             results.append(
                 draw_wind_field_heat_map(  # target
                     savepath, dt, heatmap_data, self.config, use_en,
                     last_time=last_time,
                     last_hour=last_hour,
+                    format=format,
                 )
             )
-
-        with ThreadPoolExecutor() as pool:
-            futures = []
-            for idx, site_data in enumerate(site_datas):
-                savepath = f"{base_dir}/{heatmap_data.station_code}-{time_str}--{sitenames[idx]}.png"
-                futures.append(
-                    pool.submit(
-                        draw_pollutant_plot,  # target
-                        savepath,
-                        sitenames[idx],
-                        site_data,
-                        left_max,
-                        right_max,
-                        SO2_max,
-                        self.config,
-                        use_en,  # args
-                        last_time=last_time,
-                        last_hour=last_hour,
-                    )
+        for idx, site_data in enumerate(site_datas):
+            results.append(
+                draw_pollutant_plot(
+                    pollutant_paths[idx], sitenames[idx], site_data, left_max, right_max, SO2_max, self.config, use_en,
+                    last_time=last_time,
+                    last_hour=last_hour,
+                    format=format,
                 )
-
-            for future in futures:
-                results.append(future.result())
-
+            )
         return results
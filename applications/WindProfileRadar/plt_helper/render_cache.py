@@ -0,0 +1,67 @@
+import json
+import hashlib
+import pandas as pd
+from typing import List
+from utils.config_manager import webConfig
+from utils.disk_cache import DiskCache
+from ..data_helper.models import HeatMapData
+from .configs import HeatMapConfig, ImageFormat
+from .workers import POLLUTANT_COLS
+
+# 绘图结果缓存默认配置，config.yml中wpr.render_cache的同名配置项会覆盖这些值
+DEFAULT_RENDER_CACHE_CONFIG = {
+    'enabled': True, # 是否缓存绘制好的图片
+    'dir': 'cache/render', # 缓存目录
+    'max_size_mb': 512, # 缓存目录的最大容量（MB），超出时淘汰最久未访问的图片
+    'max_age': 30 * 24 * 3600, # 图片最长保留时间（秒），为null时不按时间淘汰
+    'ttl': 3600, # 当天（时间范围未结束）的图片的有效时间（秒），数据更新后键会变化，旧图片不会再被访问
+}
+# 绘图代码的版本，修改绘图代码导致同样的输入画出不同的图片时递增，使旧的缓存失效
+RENDER_CACHE_VERSION = 2
+
+def get_render_cache_config()->dict:
+    ''' 获取绘图结果缓存配置
+    :return dict
+    '''
+    config = dict(DEFAULT_RENDER_CACHE_CONFIG)
+    config.update(webConfig.wpr.get('render_cache') or {})
+    return config
+
+_config = get_render_cache_config()
+render_cache = DiskCache(directory=_config['dir'], max_size_mb=_config['max_size_mb'], max_age=_config['max_age'], suffix='.img')
+
+def get_site_data_version(site_data:pd.DataFrame)->str:
+    ''' 站点污染物浓度数据的版本，只包含绘图用到的列 '''
+    site_data = site_data[[col for col in POLLUTANT_COLS if col in site_data.columns]]
+    hasher = hashlib.sha256('|'.join(site_data.columns).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(site_data, index=False).values.tobytes())
+    return hasher.hexdigest()
+
+def get_render_cache_key(heatmap_data:HeatMapData, site_datas, sitenames:List[str], config:HeatMapConfig, use_en:bool, format:ImageFormat)->str:
+    ''' 绘图结果的缓存键：影响图片像素的所有输入，包括绘图配置、格式、分辨率、站点名称以及热力图和各站点数据的版本
+
+    站点编码、日期等只通过数据影响图片，不直接作为键，数据相同的请求共用同一张图片
+    '''
+    return json.dumps([
+        RENDER_CACHE_VERSION,
+        config.model_dump_json(),
+        format.value,
+        bool(use_en),
+        [str(sitename) for sitename in sitenames[:len(site_datas)]],
+        heatmap_data.get_version(),
+        [get_site_data_version(site_data) for site_data in site_datas],
+    ])
+
+def load_rendered_image(key:str)->bytes|None:
+    ''' 读取缓存的图片，没有缓存时返回None '''
+    if not _config['enabled']:
+        return None
+    return render_cache.get(key)
+
+def save_rendered_image(key:str, content:bytes, finished:bool=True)->None:
+    ''' 缓存绘制好的图片
+    :param finished:数据的时间范围是否已经结束，未结束的图片在ttl秒后过期
+    '''
+    if not _config['enabled']:
+        return
+    render_cache.set(key, content, ttl=None if finished else _config['ttl'])
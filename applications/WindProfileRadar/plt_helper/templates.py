@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from utils.config_manager import webConfig
+
+# 图片模板缓存默认配置，config.yml中wpr.render.templates的同名配置项会覆盖这些值
+DEFAULT_TEMPLATE_CONFIG = {
+    'enabled': True, # 是否缓存图片模板，不缓存时每次绘图都重新创建图片
+    'max_size': 8, # 每个进程最多缓存的模板个数，超出时淘汰最久未使用的模板
+}
+
+def get_template_config()->dict:
+    ''' 获取图片模板缓存配置
+    :return dict
+    '''
+    config = dict(DEFAULT_TEMPLATE_CONFIG)
+    config.update((webConfig.wpr.get('render') or {}).get('templates') or {})
+    return config
+
+class FigureTemplateCache():
+    ''' 已经创建好坐标轴、颜色条、图例、文本等静态元素的图片模板的缓存，按(图片类型, 网格形状, 配置)区分，超出容量时按LRU淘汰
+
+    每个模板同一时间只能被一个线程使用，正在使用时其他线程临时创建新的图片
+
+    参数：
+    - max_size:最多缓存的模板个数
+    - enabled:为False时不缓存
+    '''
+    def __init__(self, max_size:int=8, enabled:bool=True):
+        self.max_size = max_size
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._items:OrderedDict[Hashable, tuple] = OrderedDict() # key: (模板, 模板的锁)
+        self._lock = threading.Lock()
+
+    def render(self, key:Hashable, build:Callable[[], Any], render:Callable[[Any], Any]):
+        ''' 使用缓存的模板绘图，没有时创建并缓存
+        :param key:模板的唯一标识
+        :param build:创建模板的无参数函数
+        :param render:使用模板绘图的函数，参数为模板
+        :return render的返回值
+        '''
+        if not self.enabled:
+            return render(build())
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+        if item is None or not item[1].acquire(blocking=False):
+            with self._lock:
+                self.misses += 1
+            template = build()
+            lock = threading.Lock()
+            lock.acquire()
+            with self._lock:
+                if key not in self._items:
+                    self._items[key] = (template, lock)
+                    while len(self._items) > self.max_size:
+                        self._items.popitem(last=False)
+        else:
+            template, lock = item
+            with self._lock:
+                self.hits += 1
+        try:
+            return render(template)
+        finally:
+            lock.release()
+
+    def clear(self)->None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self)->dict:
+        ''' 模板命中统计 '''
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0, 'count': len(self._items), 'max_size': self.max_size}
+
+_config = get_template_config()
+figure_templates = FigureTemplateCache(max_size=_config['max_size'], enabled=_config['enabled'])
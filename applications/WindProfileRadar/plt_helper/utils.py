@@ -1,6 +1,9 @@
+import io
 import matplotlib.pyplot as plt
 import matplotlib
 from matplotlib import ticker
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.patches import Rectangle
 import seaborn as sns
 import pandas as pd
@@ -14,6 +17,7 @@ from ..data_helper.models import HeatMapData
 from ..data_helper.schemas import WPR_DataType
 from ..data_helper.schemas import WindFieldDataType
 from ..data_helper.utils import minus2rep
+from .templates import figure_templates
 
 matplotlib.use("Agg")
 plt.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
@@ -24,243 +28,394 @@ matplotlib.font_manager.fontManager.addfont(font_path)
 plt.rcParams["font.family"] = ["STSong"]
 
 
-def draw_wind_field_heat_map(
-    savepath,
-    data_type: WindFieldDataType,
-    data: HeatMapData,
-    config: HeatMapConfig = HeatMapConfig(),
-    use_en: bool = True,
-    max_timedelta: int = None,
-    last_time: str = None,
-    last_hour: int = None,
-):
-    """绘制风场数据热力图
+# 恢复默认的子图位置，模板重新计算布局前使用，使布局与新建的图片一致
+SUBPLOT_PARAMS = ["left", "right", "bottom", "top", "wspace", "hspace"]
+
+
+def export_figure(fig, savepath=None, dpi: int = 300, format: str = None):
+    """导出图片，savepath为None时不保存，直接返回画布的像素；导出后图片仍可继续使用
 
     参数：
+    - fig: 图片
     - savepath: 图片保存路径
-    - data_type: 风场数据类型
-    - data: 热力图数据
-    - config: 绘图配置
+    - dpi: 分辨率
+    - format: savepath为None时有效，为'svg'时返回SVG矢量图内容
 
     返回：
-    - savepath: 图片保存路径
+    - savepath: 图片保存路径；savepath为None时返回RGB像素数组，形状为(高, 宽, 3)；format为'svg'时返回SVG内容（bytes）
     """
-    fig, ax = plt.subplots(1, 1, figsize=config.figsize)
-
-    match data_type:
-        case WindFieldDataType.HWS:
-            wind_data = data.horizontal_wind
-            scale_speed = config.arrowLegendWS
-        case WindFieldDataType.VWS:
-            wind_data = data.vertical_wind
-            scale_speed = config.arrowLegendWS / 20
-
-    wind_data.OriginWS.columns = data.col_index
-    # region 热力图绘制
-    cbar_limit = data_type.value.cbar_limit  # 颜色条范围
-    tick_locator = (
-        ticker.MaxNLocator(nbins=config.colorbarNticker)
-        if isinstance(cbar_limit, tuple)
-        else None
-    )
-    if cbar_limit is None:
-        cbar_limit = (None, None)
-
-    # if all([i is None for i in cbar_limit]):
-    #     ws_abs_max = math.ceil(wind_data.OriginWS.abs().max().max())
-    #     cbar_limit = (-ws_abs_max, ws_abs_max)
-
-    mask = wind_data.OriginWS <= 0 if data_type != WindFieldDataType.VWS else None
-    heatmap = sns.heatmap(
-        wind_data.OriginWS,
-        ax=ax,
-        vmax=cbar_limit[1],
-        vmin=cbar_limit[0],
-        annot=False,
-        cbar=False,
-        xticklabels=True,
-        yticklabels=True,
-        mask=mask,
-        cmap=data_type.value.cmap,
-    )
-    # endregion
-
-    # region 画箭头
-    quiver = ax.quiver(
-        data.grid.x,
-        data.grid.y,
-        wind_data.U,
-        wind_data.V,
-        width=config.arrowWidth,
-        headwidth=config.arrowHeadWidth,
-        pivot=config.arrowPivot,
-        units=config.arrowUnits,
-        scale_units=config.arrowScale_Units,
-        scale=100,
-    )
+    if savepath is not None:
+        fig.savefig(savepath, dpi=dpi)
+        return savepath
+    if format == "svg":
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="svg", dpi=dpi, metadata={"Date": None})  # 不写入创建时间，相同的图片内容相同
+        return buffer.getvalue()
+    origin_dpi = fig.dpi
+    fig.set_dpi(dpi)
+    fig.canvas.draw()
+    result = np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+    fig.set_dpi(origin_dpi)  # 布局按创建时的分辨率计算
+    return result
+
+
+def new_figure(figsize, dpi: int = None) -> Figure:
+    """创建不由pyplot管理的图片，不需要plt.close，可以缓存后重复使用"""
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def get_heat_values(data: pd.DataFrame, mask_nonpositive: bool = False) -> np.ma.MaskedArray:
+    """热力图数据，NaN及mask_nonpositive为True时小于等于0的值不显示"""
+    values = np.ma.masked_invalid(data.to_numpy(dtype=np.float64, na_value=np.nan))
+    if mask_nonpositive:
+        values[values <= 0] = np.ma.masked
+    return values
+
+
+def get_clim(values: np.ma.MaskedArray, cbar_limit: tuple = (None, None)) -> tuple:
+    """颜色条范围(vmin, vmax)，cbar_limit中为None的一端取数据的最小、最大值"""
+    vmin, vmax = cbar_limit
+    vmin = values.min() if vmin is None else vmin
+    vmax = values.max() if vmax is None else vmax
+    return vmin, vmax
+
+
+def draw_heat_mesh(ax, values: np.ma.MaskedArray, vmin=None, vmax=None, cmap: str = None):
+    """用pcolormesh绘制热力图，效果与sns.heatmap一致（行0在上方、网格中心为i+0.5、不显示边框），但不设置刻度
 
-    ax = plt.gca()
-    rect = Rectangle(
-        xy=(0, 0),
-        width=ax.dataLim.bounds[2],
-        height=ax.dataLim.bounds[3],
-        linewidth=2,
-        edgecolor="black",
-        facecolor="none",
-    )
-    ax.add_patch(rect)  # 加边框
-    # endregion
+    参数：
+    - ax: 坐标轴
+    - values: 高度×时间的数据，见get_heat_values
+    - vmin, vmax: 颜色条范围，见get_clim
+    - cmap: 颜色序列
 
-    # region 添加热力图颜色条
-    cbar = heatmap.figure.colorbar(
-        heatmap.collections[0], fraction=config.cFraction, pad=config.cPad
-    )
-    cbar.ax.tick_params(labelsize=config.cbTickSize)
-    cbar.outline.set_visible(False)
-    cbar.ax.yaxis.set_tick_params(
-        width=config.cbTickWid, length=config.cbTickLen, color="black"
-    )
-    # endregion
-
-    xticks = data.col_index # [0, n]
-    xticklabels = wind_data.WS.columns.tolist() # [0:00~hh:mm]
-    # region 设置动态坐标轴
-    if last_time is not None:
-        total = len(xticklabels)
-        xticks = []
-        xticklabels = []
-        max_time_delta = timestr2timedelta(last_time, TimeStr.HM)
-        total_seconds = max_time_delta.total_seconds()
-        for i in range(last_hour+1):
-            xticks.append(total * i * 3600 / total_seconds)
-            xticklabels.append(f"{i:02d}:00")
-        xticks.append(total)
-        xticklabels.append(last_time)
-        ax.set_xticks(xticks)
-    # endregion
-
-    # region 其他设置
-
-    # y轴标题字体大小
-    heatmap.yaxis.label.set_size(config.picAxisLabelSize)
-    # 热力图坐标轴刻度标签大小设置
-    heatmap.set_xticklabels(xticklabels, fontsize=config.picTickSize,rotation=config.rotXticks)
-    heatmap.set_yticklabels(heatmap.get_yticklabels(), fontsize=config.picTickSize)
-
-    # 设置坐标轴刻度数量
-    ax.locator_params(axis="x", nbins=config.nXticks)
-    ax.locator_params(axis="y", nbins=config.nYticks)
-    # 设置纵坐标标题
-    if use_en:
-        heatmap.set_ylabel(WPR_DataType.HEIGHT.value.label)
-    else:
-        heatmap.set_ylabel(WPR_DataType.HEIGHT.value.name)
-    # endregion
-
-    # region 向图中添加文本
-    # 时间范围文本
-    ax.text(
-        config.txtLocX,
-        config.txtLocY,
-        f"{get_time_str(data.start_time,config.time_str_type)} ~ {get_time_str(data.end_time,config.time_str_type)}",
-        fontdict={"size": config.txtFontSize, "color": config.txtFontColor},
-        transform=heatmap.transAxes,
-    )
-    # 颜色条标题文本
-    ax.text(
-        config.cbUnitLocX,
-        config.cbUnitLocY,
-        data_type.value.label if use_en else data_type.value.name,
-        fontdict={"size": config.txtFontSize, "color": config.txtFontColor},
-        transform=ax.transAxes,
-    )
-    # 风场类型文本
-    ax.set_title(
-        "WindField_H" if use_en else "水平风场",
-        fontdict={"fontsize": config.picTitleSize, "fontweight": "heavy"},
-        loc=config.picTitleLoc,
-        pad=config.txtLocY - 1,
-    )
-    # endregion
-
-    # region 风场图例
-    uLegend, vLegend = config.uv_legend
-    q = ax.quiver(
-        50,
-        150,
-        uLegend,
-        vLegend,
-        color=config.arrowLegendColor,
-        width=config.arrowWidth,
-        headwidth=config.arrowHeadWidth,
-        pivot=config.arrowPivot,
-        units=config.arrowUnits,
-        scale_units=config.arrowScale_Units,
-        scale=100,
-    )
+    返回：
+    - mesh: QuadMesh，可以用set_array替换数据
+    """
+    mesh = ax.pcolormesh(values, cmap=cmap, vmin=vmin, vmax=vmax)
+    ax.set(xlim=(0, values.shape[1]), ylim=(0, values.shape[0]))
+    ax.invert_yaxis()
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    return mesh
 
-    add_x1 = (
-        data.grid.x.shape[1] * config.arrowLegendLoc_X - config.arrowLegendTxtLoc_X
-    ) / data.grid.x.shape[1] + data.add_x
 
-    ax.quiverkey(
-        q, 0.2 + add_x1, 1.04, 10, " ", labelpos="E"
-    )  # labelpos 图例标签的位置，可以是'N'（北）、'S'（南）、'E'（东）或'W'（西）。这里的'E'表示图例标签位于箭头的东侧。
+def set_fixed_ticks(axis, locs, labels, nbins: int = None):
+    """设置固定位置的刻度及标签，按nbins抽稀，效果与set_ticks、set_ticklabels后再locator_params一致
 
-    # Scale文本内容
-    content = (
-        f"Scale: {str(scale_speed)} m/s"
-        if use_en
-        else f"风速：{str(config.arrowLegendWS)}米/秒"
-    )
+    参数：
+    - axis: ax.xaxis或ax.yaxis
+    - locs: 刻度位置
+    - labels: 与locs对应的刻度标签
+    - nbins: 最多显示的刻度个数，为None时不抽稀
+    """
+    locs = np.asarray(locs, dtype=np.float64)
+    tickd = dict(zip(locs, labels))
+    axis.set_major_locator(ticker.FixedLocator(locs, nbins=nbins))
+    axis.set_major_formatter(ticker.FuncFormatter(lambda x, pos: tickd.get(x, "")))
 
-    ax.text(
-        add_x1,
-        0.95 + config.arrowLegendLoc_Y - config.arrowLegendTxtLoc_Y,
-        content,
-        fontdict={"size": config.txtFontSize, "color": config.arrowLegendColor},
-        transform=heatmap.transAxes,
-    )
-    # endregion
 
-    if tick_locator:
-        cbar.locator = tick_locator
-        cbar.update_ticks()
+class HeatMapFigure:
+    """风场数据热力图
 
-    fig.tight_layout()
-    fig.subplots_adjust(left=None, bottom=None, top=None, hspace=None)
-    ax.set_position(config.position)
-    fig.savefig(savepath, dpi=config.dpi)
-    # 关闭 Figure 对象
-    plt.close(fig)
+    创建时绘制坐标轴、颜色条、边框、文本和风场图例等静态元素，render()时替换热力图数据、U、V风、刻度、时间文本和图例位置后导出。
+    matplotlib绘制方式下网格形状、绘图配置相同的数据可以重复使用同一个图片；seaborn绘制方式的刻度与数据绑定，只能使用一次
 
-    # 清除缓存
-    fig.clf()
-    return savepath  # ,[pos.x0, pos.y0, pos.width, pos.height]
+    参数：
+    - data_type: 风场数据类型
+    - data: 热力图数据
+    - config: 绘图配置
+    - use_en: 是否使用英文
+    """
 
+    def __init__(
+        self,
+        data_type: WindFieldDataType,
+        data: HeatMapData,
+        config: HeatMapConfig = HeatMapConfig(),
+        use_en: bool = True,
+    ):
+        self.data_type = data_type
+        self.config = config
+        self.fig = fig = new_figure(figsize=config.figsize)
+        self.ax = ax = fig.subplots(1, 1)
+
+        wind_data = self.get_wind_data(data)
+        match data_type:
+            case WindFieldDataType.HWS:
+                scale_speed = config.arrowLegendWS
+            case WindFieldDataType.VWS:
+                scale_speed = config.arrowLegendWS / 20
+
+        # region 热力图绘制
+        cbar_limit = data_type.value.cbar_limit  # 颜色条范围
+        tick_locator = (
+            ticker.MaxNLocator(nbins=config.colorbarNticker)
+            if isinstance(cbar_limit, tuple)
+            else None
+        )
+        if cbar_limit is None:
+            cbar_limit = (None, None)
+        self.cbar_limit = cbar_limit
+        self.mask_nonpositive = data_type != WindFieldDataType.VWS
+
+        # if all([i is None for i in cbar_limit]):
+        #     ws_abs_max = math.ceil(wind_data.OriginWS.abs().max().max())
+        #     cbar_limit = (-ws_abs_max, ws_abs_max)
+
+        if config.engine == "matplotlib":
+            values = get_heat_values(wind_data.OriginWS, self.mask_nonpositive)
+            self.mesh = draw_heat_mesh(ax, values, *get_clim(values, cbar_limit), cmap=data_type.value.cmap)
+        else:
+            origin_ws = wind_data.OriginWS.set_axis(data.col_index, axis=1) # 不修改原数据，数据可能被并发的请求共享
+            mask = origin_ws <= 0 if self.mask_nonpositive else None
+            sns.heatmap(
+                origin_ws,
+                ax=ax,
+                vmax=cbar_limit[1],
+                vmin=cbar_limit[0],
+                annot=False,
+                cbar=False,
+                xticklabels=True,
+                yticklabels=True,
+                mask=mask,
+                cmap=data_type.value.cmap,
+            )
+            self.mesh = ax.collections[0]
+        # endregion
+
+        # region 画箭头
+        self.quiver = ax.quiver(
+            data.grid.x,
+            data.grid.y,
+            wind_data.U,
+            wind_data.V,
+            width=config.arrowWidth,
+            headwidth=config.arrowHeadWidth,
+            pivot=config.arrowPivot,
+            units=config.arrowUnits,
+            scale_units=config.arrowScale_Units,
+            scale=100,
+        )
 
-def draw_pollutant_plot(
+        rect = Rectangle(
+            xy=(0, 0),
+            width=ax.dataLim.bounds[2],
+            height=ax.dataLim.bounds[3],
+            linewidth=2,
+            edgecolor="black",
+            facecolor="none",
+        )
+        ax.add_patch(rect)  # 加边框
+        # endregion
+
+        # region 添加热力图颜色条
+        cbar = fig.colorbar(self.mesh, fraction=config.cFraction, pad=config.cPad)
+        cbar.ax.tick_params(labelsize=config.cbTickSize)
+        cbar.outline.set_visible(False)
+        cbar.ax.yaxis.set_tick_params(
+            width=config.cbTickWid, length=config.cbTickLen, color="black"
+        )
+        # endregion
+
+        # region 其他设置
+
+        # y轴标题字体大小
+        ax.yaxis.label.set_size(config.picAxisLabelSize)
+        if config.engine == "matplotlib":
+            ax.tick_params(axis="x", labelsize=config.picTickSize, labelrotation=config.rotXticks)
+            ax.tick_params(axis="y", labelsize=config.picTickSize)
+        # 设置纵坐标标题
+        if use_en:
+            ax.set_ylabel(WPR_DataType.HEIGHT.value.label)
+        else:
+            ax.set_ylabel(WPR_DataType.HEIGHT.value.name)
+        # endregion
+
+        # region 向图中添加文本
+        # 时间范围文本
+        self.time_text = ax.text(
+            config.txtLocX,
+            config.txtLocY,
+            self.get_time_text(data),
+            fontdict={"size": config.txtFontSize, "color": config.txtFontColor},
+            transform=ax.transAxes,
+        )
+        # 颜色条标题文本
+        ax.text(
+            config.cbUnitLocX,
+            config.cbUnitLocY,
+            data_type.value.label if use_en else data_type.value.name,
+            fontdict={"size": config.txtFontSize, "color": config.txtFontColor},
+            transform=ax.transAxes,
+        )
+        # 风场类型文本
+        ax.set_title(
+            "WindField_H" if use_en else "水平风场",
+            fontdict={"fontsize": config.picTitleSize, "fontweight": "heavy"},
+            loc=config.picTitleLoc,
+            pad=config.txtLocY - 1,
+        )
+        # endregion
+
+        # region 风场图例
+        uLegend, vLegend = config.uv_legend
+        q = ax.quiver(
+            50,
+            150,
+            uLegend,
+            vLegend,
+            color=config.arrowLegendColor,
+            width=config.arrowWidth,
+            headwidth=config.arrowHeadWidth,
+            pivot=config.arrowPivot,
+            units=config.arrowUnits,
+            scale_units=config.arrowScale_Units,
+            scale=100,
+        )
+
+        # 图例位置中与时间范围无关的部分
+        self.legend_x = (
+            data.grid.x.shape[1] * config.arrowLegendLoc_X - config.arrowLegendTxtLoc_X
+        ) / data.grid.x.shape[1]
+        add_x1 = self.legend_x + data.add_x
+
+        self.quiver_key = ax.quiverkey(
+            q, 0.2 + add_x1, 1.04, 10, " ", labelpos="E"
+        )  # labelpos 图例标签的位置，可以是'N'（北）、'S'（南）、'E'（东）或'W'（西）。这里的'E'表示图例标签位于箭头的东侧。
+
+        # Scale文本内容
+        content = (
+            f"Scale: {str(scale_speed)} m/s"
+            if use_en
+            else f"风速：{str(config.arrowLegendWS)}米/秒"
+        )
+
+        self.scale_text = ax.text(
+            add_x1,
+            0.95 + config.arrowLegendLoc_Y - config.arrowLegendTxtLoc_Y,
+            content,
+            fontdict={"size": config.txtFontSize, "color": config.arrowLegendColor},
+            transform=ax.transAxes,
+        )
+        # endregion
+
+        if tick_locator:
+            cbar.locator = tick_locator
+            cbar.update_ticks()
+
+    def get_wind_data(self, data: HeatMapData):
+        return data.horizontal_wind if self.data_type == WindFieldDataType.HWS else data.vertical_wind
+
+    def get_time_text(self, data: HeatMapData) -> str:
+        return f"{get_time_str(data.start_time,self.config.time_str_type)} ~ {get_time_str(data.end_time,self.config.time_str_type)}"
+
+    def render(self, savepath, data: HeatMapData, last_time: str = None, last_hour: int = None, format: str = None):
+        """替换为data的数据后导出图片
+
+        参数：
+        - savepath: 图片保存路径，为None时不保存
+        - data: 热力图数据，网格形状与创建时的数据一致
+        - last_time, last_hour: 最后的风廓线雷达时间及整点，用于设置动态坐标轴
+        - format: 不保存时的导出格式，见export_figure
+
+        返回：
+        - savepath: 图片保存路径；savepath为None时返回RGB像素数组或SVG内容
+        """
+        config, fig, ax = self.config, self.fig, self.ax
+        wind_data = self.get_wind_data(data)
+        if config.engine == "matplotlib":
+            values = get_heat_values(wind_data.OriginWS, self.mask_nonpositive)
+            self.mesh.set_array(values)
+            self.mesh.set_clim(*get_clim(values, self.cbar_limit))
+            self.quiver.set_UVC(wind_data.U, wind_data.V)
+            self.time_text.set_text(self.get_time_text(data))
+            add_x1 = self.legend_x + data.add_x
+            self.quiver_key.X = 0.2 + add_x1
+            self.scale_text.set_x(add_x1)
+
+        xticks = data.col_index # [0, n]
+        xticklabels = wind_data.WS.columns.tolist() # [0:00~hh:mm]
+        # region 设置动态坐标轴
+        if last_time is not None:
+            total = len(xticklabels)
+            xticks = []
+            xticklabels = []
+            max_time_delta = timestr2timedelta(last_time, TimeStr.HM)
+            total_seconds = max_time_delta.total_seconds()
+            for i in range(last_hour+1):
+                xticks.append(total * i * 3600 / total_seconds)
+                xticklabels.append(f"{i:02d}:00")
+            xticks.append(total)
+            xticklabels.append(last_time)
+            if config.engine != "matplotlib":
+                ax.set_xticks(xticks)
+        # endregion
+
+        if config.engine == "matplotlib":
+            # 直接设置抽稀后的刻度，只为显示的刻度创建刻度对象
+            set_fixed_ticks(ax.xaxis, xticks if last_time is not None else data.col_index + 0.5, xticklabels, nbins=config.nXticks)
+            set_fixed_ticks(ax.yaxis, np.arange(len(wind_data.OriginWS.index)) + 0.5, [f"{h:g}" for h in wind_data.OriginWS.index.values], nbins=config.nYticks)
+            plt.setp(ax.get_yticklabels(), va="center")
+        else:
+            # 热力图坐标轴刻度标签大小设置
+            ax.set_xticklabels(xticklabels, fontsize=config.picTickSize,rotation=config.rotXticks)
+            ax.set_yticklabels(ax.get_yticklabels(), fontsize=config.picTickSize)
+
+            # 设置坐标轴刻度数量
+            ax.locator_params(axis="x", nbins=config.nXticks)
+            ax.locator_params(axis="y", nbins=config.nYticks)
+
+        fig.subplots_adjust(**{key: matplotlib.rcParams[f"figure.subplot.{key}"] for key in SUBPLOT_PARAMS})
+        fig.tight_layout()
+        fig.subplots_adjust(left=None, bottom=None, top=None, hspace=None)
+        ax.set_position(config.position)
+        return export_figure(fig, savepath, dpi=config.dpi, format=format)  # ,[pos.x0, pos.y0, pos.width, pos.height]
+
+
+def draw_wind_field_heat_map(
     savepath,
-    sitename,
-    site_data,
-    left_max,
-    right_max,
-    SO2_max,
+    data_type: WindFieldDataType,
+    data: HeatMapData,
     config: HeatMapConfig = HeatMapConfig(),
     use_en: bool = True,
-    max_timedelta: timedelta = None,
+    max_timedelta: int = None,
     last_time: str = None,
     last_hour: int = None,
+    format: str = None,
 ):
-    """绘制污染物浓度折线图"""
-    fig, ax_AQ = plt.subplots(1, 1, figsize=config.figsize, dpi=config.dpi)
-    fig.tight_layout()
-    fig.subplots_adjust(left=None, bottom=None, top=None, hspace=None)
+    """绘制风场数据热力图，matplotlib绘制方式下重复使用网格形状、绘图配置相同的图片模板
+
+    参数：
+    - savepath: 图片保存路径，为None时不保存
+    - data_type: 风场数据类型
+    - data: 热力图数据
+    - config: 绘图配置，按config.dpi绘制
+    - format: 不保存时的导出格式，为'svg'时返回SVG内容
+
+    返回：
+    - savepath: 图片保存路径；savepath为None时返回RGB像素数组或SVG内容
+    """
+    if config.engine != "matplotlib":
+        return HeatMapFigure(data_type, data, config, use_en).render(savepath, data, last_time=last_time, last_hour=last_hour, format=format)
+    shape = (data.horizontal_wind if data_type == WindFieldDataType.HWS else data.vertical_wind).OriginWS.shape
+    return figure_templates.render(
+        ("heat_map", data_type.name, shape, config.model_dump_json(), use_en),
+        lambda: HeatMapFigure(data_type, data, config, use_en),
+        lambda figure: figure.render(savepath, data, last_time=last_time, last_hour=last_hour, format=format),
+    )
 
-    ax2 = ax_AQ.twinx()
-    ax3 = ax_AQ.twinx()
-    ax3.spines["right"].set_position(("outward", 15))
 
+def get_pollutant_plot_data(site_data: pd.DataFrame) -> tuple:
+    """污染物浓度折线图的数据
+
+    返回：
+    - xticklabels: 时间（时:分）
+    - x_plot: 横坐标
+    - y_plot: 各污染物的浓度，键为TargetPollutants
+    """
     # 通过接口获取的空气质量数据是按时间倒序排列的，需重新排序
     site_data = site_data.sort_values(by=["timePoint"])
     # 获取时间列表
@@ -271,124 +426,204 @@ def draw_pollutant_plot(
         datetime_ = pd.to_datetime(item)
         xticklabels.append(get_time_str(datetime_, TimeStr.HM))
     x_plot = np.arange(0, len(xticklabels))
+    y_plot = {}
     for item_pol in TargetPollutants:
         # 获取指定参数
-        data_pol = site_data[item_pol.value.annotation.value.col_name].apply(
+        y_plot[item_pol] = site_data[item_pol.value.annotation.value.col_name].apply(
             lambda x: minus2rep(x, np.nan)
         )
+    return xticklabels, x_plot, y_plot
 
-        match item_pol:
-            case TargetPollutants.PM10 | TargetPollutants.O3:
-                item_pol.value.plot(ax=ax_AQ, x=x_plot, y=data_pol, use_en=use_en)
-            case TargetPollutants.PM25 | TargetPollutants.NO2:
-                item_pol.value.plot(ax=ax2, x=x_plot, y=data_pol, use_en=use_en)
-            case TargetPollutants.SO2:
-                item_pol.value.plot(ax=ax3, x=x_plot, y=data_pol, use_en=use_en)
-
-    ax_AQ.set_ylim(bottom=0, top=left_max + 3)
-    ax_AQ.tick_params(labelsize=config.picTickSize)
-    ax_AQ.tick_params(axis="y", color=TargetPollutants.O3.value.color)
-    for t in ax_AQ.get_yticklabels():
-        t.set_color(TargetPollutants.O3.value.color)
-    ax_AQ.set_ylabel(
-        (
-            TargetPollutants.O3.value.annotation.value.unit
-            if use_en
-            else TargetPollutants.O3.value.annotation.value.unit_cn
-        ),
-        fontdict={
-            "size": config.picAxisLabelSize,
-            "color": TargetPollutants.O3.value.color,
-        },
-    )
-    """locator = ticker.MaxNLocator(nbins=2)
-    ax_AQ.yaxis.set_major_locator(locator)"""
-
-    ax2.set_ylim(bottom=0, top=right_max + 10)
-    ax2.tick_params(labelsize=config.picTickSize)
-    ax2.tick_params(axis="y", color=TargetPollutants.PM25.value.color)
-    for t in ax2.get_yticklabels():
-        t.set_color(TargetPollutants.PM25.value.color)
-    ax2.set_ylabel(None)
-
-    ax3.set_ylim(bottom=0, top=SO2_max + 3)
-    ax3.tick_params(labelsize=config.picTickSize)
-    ax3.tick_params(axis="y", color=TargetPollutants.SO2.value.color)
-    for t in ax3.get_yticklabels():
-        t.set_color(TargetPollutants.SO2.value.color)
-    ax3.set_ylabel(
-        (
-            TargetPollutants.SO2.value.annotation.value.unit
-            if use_en
-            else TargetPollutants.SO2.value.annotation.value.unit_cn
-        ),
-        fontdict={
-            "size": config.picAxisLabelSize,
-            "color": TargetPollutants.SO2.value.color,
-        },
-    )
 
-    # region 动态设置横坐标轴范围
-    
-    # region 设置动态坐标轴
-    if last_time is not None:
-        time_delta_list = [timestr2timedelta(t, TimeStr.HM.value) for t in xticklabels]
-        time_delta = max(time_delta_list)
-        max_time_delta = timestr2timedelta(last_time, TimeStr.HM)
-        # if max_time_delta != time_delta:
-        xmax_new = (len(xticklabels) - 1) / time_delta.total_seconds() * max_time_delta.total_seconds()
-        ax_AQ.set_xlim(0, xmax_new)
-
-        if last_hour is not None:
-            site_data_last_hour = time_delta_list[time_delta_list.index(time_delta)] # 站点数据的最后一个小时
-
-            site_data_last_hour = math.floor(site_data_last_hour.total_seconds() / 3600)
-            # 风廓线雷达小时大于站点数据小时，则取站点数据小时
-
-            if last_hour > site_data_last_hour:
-                xticklabels.extend([f"{i:02d}:00" for i in range(site_data_last_hour + 1, last_hour + 1)])
-
-    xticks = list(range(0, len(xticklabels)))
-    ax_AQ.set_xticks(xticks)
-    ax_AQ.set_xticklabels(xticklabels, rotation=config.rotXticks)
-
-    # 设置横坐标刻度个数
-    ax_AQ.locator_params(axis="x", nbins=len(xticklabels))
-    # 设置横坐标范围，确保折线的起始位置在y轴
-    # ax_AQ.set_xlim(0, len(xtickLabel) - 1)
-    # 将横坐标刻度标签替换为时间，并选装刻度标签
-    
-    # 设置折线图标题，即参数名称
-    ax_AQ.set_title(
-        "污染物浓度" if not use_en else sitename,
-        fontdict={"fontsize": config.picTitleSize, "fontweight": "heavy"},
-        loc=config.picTitleLoc,
-        pad=config.txtLocY,
-    )
-    # 添加图例
-    linesMajor, labelsMajor = ax_AQ.get_legend_handles_labels()
-    linesMinor, labelsMinor = ax2.get_legend_handles_labels()
-    linesMinor3, labelsMinor3 = ax3.get_legend_handles_labels()
-    lines = linesMajor + linesMinor + linesMinor3
-    labels = labelsMajor + labelsMinor + labelsMinor3
-    leg = ax_AQ.legend(
-        lines, labels, prop={"weight": "normal", "size": 6}, ncol=5, loc=(0.41, 0.98)
-    )
-    # 去掉图例边框
-    leg.get_frame().set_linewidth(0.0)
-    leg.get_frame().set_facecolor("none")
+class PollutantFigure:
+    """污染物浓度折线图
 
-    # 设置坐标轴刻度标签字体大小
-    # plt.tick_params(labelsize=config.drawRadarAQ.picTickSize)
+    创建时绘制坐标轴、折线、坐标轴标题和图例，render()时替换折线数据、坐标轴范围、刻度和标题后导出。
+    设置了动态坐标轴（last_time）时，绘图配置相同的数据可以重复使用同一个图片
 
-    # 重置折线图宽度，确保与上面热力图对齐
-    # if position is not None and len(position)==4:
-    ax_AQ.set_position(config.position)
+    参数：
+    - site_data: 站点污染物浓度数据
+    - config: 绘图配置
+    - use_en: 是否使用英文
+    """
+
+    def __init__(
+        self,
+        site_data: pd.DataFrame,
+        config: HeatMapConfig = HeatMapConfig(),
+        use_en: bool = True,
+    ):
+        self.config = config
+        self.use_en = use_en
+        self.fig = fig = new_figure(figsize=config.figsize, dpi=config.dpi)
+        self.ax_AQ = ax_AQ = fig.subplots(1, 1)
+        fig.tight_layout()
+        fig.subplots_adjust(left=None, bottom=None, top=None, hspace=None)
+
+        self.ax2 = ax2 = ax_AQ.twinx()
+        self.ax3 = ax3 = ax_AQ.twinx()
+        ax3.spines["right"].set_position(("outward", 15))
+
+        _, x_plot, y_plot = get_pollutant_plot_data(site_data)
+        self.lines = {}
+        for item_pol in TargetPollutants:
+            match item_pol:
+                case TargetPollutants.PM10 | TargetPollutants.O3:
+                    ax = ax_AQ
+                case TargetPollutants.PM25 | TargetPollutants.NO2:
+                    ax = ax2
+                case TargetPollutants.SO2:
+                    ax = ax3
+            self.lines[item_pol], = item_pol.value.plot(ax=ax, x=x_plot, y=y_plot[item_pol], use_en=use_en)
+
+        ax_AQ.tick_params(labelsize=config.picTickSize)
+        ax_AQ.tick_params(axis="y", color=TargetPollutants.O3.value.color)
+        ax_AQ.set_ylabel(
+            (
+                TargetPollutants.O3.value.annotation.value.unit
+                if use_en
+                else TargetPollutants.O3.value.annotation.value.unit_cn
+            ),
+            fontdict={
+                "size": config.picAxisLabelSize,
+                "color": TargetPollutants.O3.value.color,
+            },
+        )
+        """locator = ticker.MaxNLocator(nbins=2)
+        ax_AQ.yaxis.set_major_locator(locator)"""
+
+        ax2.tick_params(labelsize=config.picTickSize)
+        ax2.tick_params(axis="y", color=TargetPollutants.PM25.value.color)
+        ax2.set_ylabel(None)
+
+        ax3.tick_params(labelsize=config.picTickSize)
+        ax3.tick_params(axis="y", color=TargetPollutants.SO2.value.color)
+        ax3.set_ylabel(
+            (
+                TargetPollutants.SO2.value.annotation.value.unit
+                if use_en
+                else TargetPollutants.SO2.value.annotation.value.unit_cn
+            ),
+            fontdict={
+                "size": config.picAxisLabelSize,
+                "color": TargetPollutants.SO2.value.color,
+            },
+        )
+
+        # 添加图例
+        linesMajor, labelsMajor = ax_AQ.get_legend_handles_labels()
+        linesMinor, labelsMinor = ax2.get_legend_handles_labels()
+        linesMinor3, labelsMinor3 = ax3.get_legend_handles_labels()
+        lines = linesMajor + linesMinor + linesMinor3
+        labels = labelsMajor + labelsMinor + labelsMinor3
+        leg = ax_AQ.legend(
+            lines, labels, prop={"weight": "normal", "size": 6}, ncol=5, loc=(0.41, 0.98)
+        )
+        # 去掉图例边框
+        leg.get_frame().set_linewidth(0.0)
+        leg.get_frame().set_facecolor("none")
+
+    def render(
+        self,
+        savepath,
+        sitename,
+        site_data,
+        left_max,
+        right_max,
+        SO2_max,
+        last_time: str = None,
+        last_hour: int = None,
+        format: str = None,
+    ):
+        """替换为site_data的数据后按config.dpi导出图片，返回值同export_figure"""
+        config, ax_AQ, ax2, ax3 = self.config, self.ax_AQ, self.ax2, self.ax3
+        xticklabels, x_plot, y_plot = get_pollutant_plot_data(site_data)
+        for item_pol, line in self.lines.items():
+            line.set_data(x_plot, y_plot[item_pol])
+
+        ax_AQ.set_ylim(bottom=0, top=left_max + 3)
+        for t in ax_AQ.get_yticklabels():
+            t.set_color(TargetPollutants.O3.value.color)
+
+        ax2.set_ylim(bottom=0, top=right_max + 10)
+        for t in ax2.get_yticklabels():
+            t.set_color(TargetPollutants.PM25.value.color)
+
+        ax3.set_ylim(bottom=0, top=SO2_max + 3)
+        for t in ax3.get_yticklabels():
+            t.set_color(TargetPollutants.SO2.value.color)
+
+        # region 动态设置横坐标轴范围
+        
+        # region 设置动态坐标轴
+        if last_time is not None:
+            time_delta_list = [timestr2timedelta(t, TimeStr.HM.value) for t in xticklabels]
+            time_delta = max(time_delta_list)
+            max_time_delta = timestr2timedelta(last_time, TimeStr.HM)
+            # if max_time_delta != time_delta:
+            xmax_new = (len(xticklabels) - 1) / time_delta.total_seconds() * max_time_delta.total_seconds()
+            ax_AQ.set_xlim(0, xmax_new)
+
+            if last_hour is not None:
+                site_data_last_hour = time_delta_list[time_delta_list.index(time_delta)] # 站点数据的最后一个小时
+
+                site_data_last_hour = math.floor(site_data_last_hour.total_seconds() / 3600)
+                # 风廓线雷达小时大于站点数据小时，则取站点数据小时
+
+                if last_hour > site_data_last_hour:
+                    xticklabels.extend([f"{i:02d}:00" for i in range(site_data_last_hour + 1, last_hour + 1)])
+
+        xticks = list(range(0, len(xticklabels)))
+        ax_AQ.set_xticks(xticks)
+        ax_AQ.set_xticklabels(xticklabels, rotation=config.rotXticks)
+
+        # 设置横坐标刻度个数
+        ax_AQ.locator_params(axis="x", nbins=len(xticklabels))
+        # 设置横坐标范围，确保折线的起始位置在y轴
+        # ax_AQ.set_xlim(0, len(xtickLabel) - 1)
+        # 将横坐标刻度标签替换为时间，并选装刻度标签
+        
+        # 设置折线图标题，即参数名称
+        ax_AQ.set_title(
+            "污染物浓度" if not self.use_en else sitename,
+            fontdict={"fontsize": config.picTitleSize, "fontweight": "heavy"},
+            loc=config.picTitleLoc,
+            pad=config.txtLocY,
+        )
+
+        # 设置坐标轴刻度标签字体大小
+        # plt.tick_params(labelsize=config.drawRadarAQ.picTickSize)
+
+        # 重置折线图宽度，确保与上面热力图对齐
+        # if position is not None and len(position)==4:
+        ax_AQ.set_position(config.position)
+
+        return export_figure(self.fig, savepath, dpi=config.dpi, format=format)
 
-    fig.savefig(savepath, dpi=300)
-    # 关闭 Figure 对象
-    plt.close(fig)
 
-    # 清除缓存
-    fig.clf()
-    return savepath
+def draw_pollutant_plot(
+    savepath,
+    sitename,
+    site_data,
+    left_max,
+    right_max,
+    SO2_max,
+    config: HeatMapConfig = HeatMapConfig(),
+    use_en: bool = True,
+    max_timedelta: timedelta = None,
+    last_time: str = None,
+    last_hour: int = None,
+    format: str = None,
+):
+    """绘制污染物浓度折线图，savepath为None时返回RGB像素数组，format为'svg'时返回SVG内容
+
+    设置了动态坐标轴（last_time）时重复使用绘图配置相同的图片模板，否则横坐标范围由数据自动确定，每次创建新的图片
+    """
+    args = (savepath, sitename, site_data, left_max, right_max, SO2_max)
+    if last_time is None:
+        return PollutantFigure(site_data, config, use_en).render(*args, format=format)
+    return figure_templates.render(
+        ("pollutant", config.model_dump_json(), use_en),
+        lambda: PollutantFigure(site_data, config, use_en),
+        lambda figure: figure.render(*args, last_time=last_time, last_hour=last_hour, format=format),
+    )
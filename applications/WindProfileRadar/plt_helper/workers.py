@@ -0,0 +1,115 @@
+import os
+import copy
+import numpy as np
+import pandas as pd
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+from typing import Callable
+from utils.config_manager import webConfig
+from ..data_helper.models import HeatMapData
+from ..data_helper.schemas import WindFieldDataType
+from .configs import HeatMapConfig, TargetPollutants
+from .utils import draw_wind_field_heat_map, draw_pollutant_plot # 导入时设置Agg后端并注册STSong字体
+
+# 绘图进程池默认配置，config.yml中wpr.render的同名配置项会覆盖这些值
+DEFAULT_RENDER_CONFIG = {
+    'enabled': True, # 是否启用绘图进程池，不启用时在当前线程中依次绘制
+    'processes': None, # 进程数，为None时等于CPU核数
+    'start_method': None, # 子进程的启动方式（fork/spawn/forkserver），为None时使用系统默认值
+}
+# 折线图需要的列，其余列不发送给子进程
+POLLUTANT_COLS = ['timePoint'] + [p.value.annotation.value.col_name for p in TargetPollutants]
+
+def get_render_config()->dict:
+    ''' 获取绘图进程池配置
+    :return dict
+    '''
+    config = dict(DEFAULT_RENDER_CONFIG)
+    config.update(webConfig.wpr.get('render') or {})
+    return config
+
+@lru_cache(maxsize=32)
+def get_config(config_json:str)->HeatMapConfig:
+    ''' 子进程中按JSON还原绘图配置，相同的配置只解析一次 '''
+    return HeatMapConfig.model_validate_json(config_json)
+
+def _warm_up()->int:
+    ''' 子进程中执行：导入matplotlib、seaborn，注册字体并创建默认绘图配置 '''
+    get_config(HeatMapConfig().model_dump_json())
+    return os.getpid()
+
+def get_panel_data(data:HeatMapData, data_type:WindFieldDataType)->HeatMapData:
+    ''' 只保留绘制data_type的热力图需要的数组（原始风速、U、V风和网格坐标），减少发送给子进程的数据量
+    
+    返回浅拷贝，不修改原数据，数据可能被并发的请求共享
+    '''
+    panel = copy.copy(data)
+    match data_type:
+        case WindFieldDataType.HWS:
+            attr, other = 'horizontal_wind', 'vertical_wind'
+        case WindFieldDataType.VWS:
+            attr, other = 'vertical_wind', 'horizontal_wind'
+    wind_data = copy.copy(getattr(data, attr))
+    wind_data.WS = wind_data.WS.iloc[:0] # 只用到时间列
+    wind_data.WD = None
+    setattr(panel, attr, wind_data)
+    setattr(panel, other, None)
+    return panel
+
+def _draw_heat_map(savepath:str, data_type_name:str, data:HeatMapData, config_json:str, use_en:bool, last_time:str, last_hour:int, format:str=None)->str|np.ndarray|bytes:
+    ''' 子进程中执行：绘制风场热力图
+    :param data_type_name:WindFieldDataType的名称，枚举值不能按值反序列化
+    '''
+    return draw_wind_field_heat_map(savepath, WindFieldDataType[data_type_name], data, get_config(config_json), use_en,
+        last_time=last_time, last_hour=last_hour, format=format)
+
+def _draw_pollutant_plot(savepath:str, sitename:str, site_data:pd.DataFrame, left_max, right_max, SO2_max, config_json:str, use_en:bool, last_time:str, last_hour:int, format:str=None)->str|np.ndarray|bytes:
+    ''' 子进程中执行：绘制污染物浓度折线图 '''
+    return draw_pollutant_plot(savepath, sitename, site_data, left_max, right_max, SO2_max, get_config(config_json), use_en,
+        last_time=last_time, last_hour=last_hour, format=format)
+
+class RenderPool():
+    ''' 常驻的绘图进程池，在应用启动时调用start()创建子进程，关闭时调用shutdown()
+
+    pyplot的全局状态不是线程安全的，每个子进程同一时间只绘制一张图；同一个请求的各张图在不同的进程中并行绘制
+    '''
+    def __init__(self):
+        self.config = get_render_config()
+        self._executor = None
+
+    @property
+    def started(self)->bool:
+        return self._executor is not None
+
+    def start(self)->None:
+        if self.started or not self.config['enabled']:
+            return
+        processes = self.config['processes'] or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=get_context(self.config['start_method']))
+        # 启动时就创建所有子进程并完成字体注册等初始化，避免第一次请求时再创建
+        for future in [self._executor.submit(_warm_up) for _ in range(processes)]:
+            future.result()
+
+    def shutdown(self)->None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, func:Callable, *args, **kwargs)->Future:
+        ''' 提交绘图任务，需要先调用start() '''
+        if self._executor is None:
+            raise RuntimeError('绘图进程池未启动')
+        return self._executor.submit(func, *args, **kwargs)
+
+    def draw_heat_map(self, savepath:str, data_type:WindFieldDataType, data:HeatMapData, config:HeatMapConfig, use_en:bool=True, last_time:str=None, last_hour:int=None, format:str=None)->Future:
+        ''' 提交风场热力图绘制任务，只发送该风场需要的数组 '''
+        return self.submit(_draw_heat_map, savepath, data_type.name, get_panel_data(data, data_type), config.model_dump_json(), use_en, last_time, last_hour, format)
+
+    def draw_pollutant_plot(self, savepath:str, sitename:str, site_data:pd.DataFrame, left_max, right_max, SO2_max, config:HeatMapConfig, use_en:bool=True, last_time:str=None, last_hour:int=None, format:str=None)->Future:
+        ''' 提交污染物浓度折线图绘制任务，只发送需要的列 '''
+        site_data = site_data[[col for col in POLLUTANT_COLS if col in site_data.columns]]
+        return self.submit(_draw_pollutant_plot, savepath, sitename, site_data, left_max, right_max, SO2_max,
+            config.model_dump_json(), use_en, last_time, last_hour, format)
+
+render_pool = RenderPool()
@@ -7,10 +7,11 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from fastapi.testclient import TestClient
+import httpx
 # custom
 from utils.config_manager import webConfig
 from utils.router_manager import Router,RouterManager
+import api
 import warnings
 warnings.filterwarnings("ignore")
 app = FastAPI(
@@ -63,14 +64,17 @@ ROUTER_MANAGER.add_routers_to(app)
 #region 定时任务
 scheduler = AsyncIOScheduler() # 实例化调度器
 
-client = TestClient(app)
+def get_app_client()->httpx.AsyncClient:
+    ''' 直接调用本应用接口的客户端，在应用自己的事件循环中执行，不经过网络，用完需要关闭 '''
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://scheduler', timeout=None)
 
 @scheduler.scheduled_job('interval', minutes=60) # 每60分钟更新一次当天的数据
 async def get_WPR_img_job():
     # 获取今天到前30天的日期列表
     today = datetime.date.today()
     # 调用接口
-    client.get('/WPR/Img', params={'date': today.strftime('%Y-%m-%d')})
+    async with get_app_client() as client:
+        await client.get('/WPR/Img', params={'date': today.strftime('%Y-%m-%d')})
 
 # 每天12点执行一次
 @scheduler.scheduled_job('cron', hour=23, minute=26) # 每天执行一次, 缓存近30天的数据
@@ -78,9 +82,10 @@ async def get_WPR_img_today():
     # 获取今天到前30天的日期列表
     today = datetime.date.today()
     dates = [today - datetime.timedelta(days=i) for i in range(1,31)]
-    for date in dates:
-        # 调用接口
-        client.get('/WPR/Img', params={'date': date.strftime('%Y-%m-%d')})
+    async with get_app_client() as client:
+        for date in dates:
+            # 调用接口
+            await client.get('/WPR/Img', params={'date': date.strftime('%Y-%m-%d')})
 
 @app.on_event("startup")
 async def start_scheduler():
@@ -89,12 +94,15 @@ async def start_scheduler():
 @app.on_event("shutdown")
 async def shutdown_scheduler():
     scheduler.shutdown()
+    api.close_session() # 关闭外部接口的连接池
+    await api.aclose_async_client()
 #endregion
 
 if __name__=='__main__':
+    server = dict(webConfig.server)
+    server.setdefault('workers', 1) # 多个进程共用同一个SQLite数据库（WAL模式）
     uvicorn.run(
         app="main:app",
         use_colors=True,
-        workers=1,
-        **webConfig.server
+        **server
     )
\ No newline at end of file
@@ -0,0 +1,64 @@
+import os
+import sys
+import shutil
+import importlib
+import pytest
+import matplotlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 测试用的最小配置：外部接口地址不可访问（由测试替换为桩函数），关闭进程池和各级缓存
+TEST_CONFIG = '''
+app:
+  config:
+    title: test
+  cors:
+    allow_origins: ['*']
+server:
+  host: 127.0.0.1
+  port: 8001
+api:
+  cache:
+    enabled: false
+  AQ:
+    url: http://127.0.0.1:9/aq
+    token:
+      access-token: test
+  WPR:
+    url: http://127.0.0.1:9/wpr
+    token:
+      key: token
+      value: test
+database:
+  sqlite:
+    wpr:
+      url: sqlite:///databases/wpr.db
+sqlalchemy:
+  echo: false
+wpr:
+  workers:
+    enabled: false
+  heatmap_cache:
+    enabled: false
+  render:
+    enabled: false
+  render_cache:
+    enabled: false
+'''
+
+@pytest.fixture(scope='session')
+def wpr_main(tmp_path_factory):
+    ''' 在临时目录中（配置文件、字体、数据库都是相对路径）导入风廓线雷达应用模块 '''
+    workdir = tmp_path_factory.mktemp('wpr')
+    (workdir / 'config.yml').write_text(TEST_CONFIG, encoding='utf-8')
+    (workdir / 'databases').mkdir()
+    font_dir = workdir / 'static' / 'resources' / 'fonts'
+    font_dir.mkdir(parents=True)
+    shutil.copy(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf'), font_dir / 'STSONG.TTF')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        yield importlib.import_module('applications.WindProfileRadar.main')
+    finally:
+        os.chdir(cwd)
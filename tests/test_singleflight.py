@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import httpx
+from fastapi import FastAPI
+import numpy as np
+import pandas as pd
+import pytest
+from utils.singleflight import SingleFlight
+
+def test_do_shares_result():
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'result'
+
+    async def main():
+        return await asyncio.gather(*[flight.do('k', load) for _ in range(5)])
+
+    assert asyncio.run(main()) == ['result'] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {'leaders': 1, 'followers': 4, 'in_flight': 0}
+
+def test_do_shares_exception():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise ValueError('failed')
+
+    async def main():
+        return await asyncio.gather(*[flight.do('k', load) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+@pytest.mark.parametrize('cancelled', [0, 1])
+def test_cancelled_waiter_does_not_affect_others(cancelled):
+    ''' 取消执行者（0）或某个等待者（1），其余请求仍得到结果，执行只进行一次 '''
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 'result'
+
+    async def main():
+        tasks = [asyncio.create_task(flight.do('k', load)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        tasks[cancelled].cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 执行完成后同一个key可以再次执行
+        again = await flight.do('k', load)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert isinstance(results[cancelled], asyncio.CancelledError)
+    assert [result for idx, result in enumerate(results) if idx != cancelled] == ['result', 'result']
+    assert again == 'result'
+    assert len(calls) == 2
+    assert flight.stats()['in_flight'] == 0
+
+def get_wpr_frame(date_str:str)->pd.DataFrame:
+    ''' 模拟的风廓线雷达数据：每30分钟一个时间点，60~3060米每60米一层 '''
+    rng = np.random.default_rng(0)
+    times = pd.date_range(f'{date_str} 00:00:00', f'{date_str} 23:30:00', freq='30min').strftime('%Y-%m-%d %H:%M:%S')
+    heights = np.arange(60, 3061, 60)
+    time_points, height = np.meshgrid(times, heights, indexing='ij')
+    n = time_points.size
+    return pd.DataFrame({
+        'timePoint': time_points.ravel().astype(object),
+        'height': height.ravel(),
+        'hws': rng.uniform(0, 12, n).round(1),
+        'hwd': rng.uniform(0, 359, n).round(1),
+        'vws': rng.uniform(-1, 1, n).round(2),
+    })
+
+def get_AQ_frame(date_str:str)->pd.DataFrame:
+    rng = np.random.default_rng(1)
+    cols = ['pM25', 'pM10', 'nO2', 'o3', 'sO2']
+    return pd.DataFrame({
+        'timePoint': [f'{date_str} {h:02d}:00:00' for h in range(24)],
+        **{col: rng.uniform(1, 80, 24).round(1) for col in cols},
+    })
+
+def test_concurrent_img_requests_coalesce(wpr_main, monkeypatch):
+    ''' 并发的相同/WPR/Img请求只请求一次风廓线雷达数据、只绘制一次 '''
+    date_str = (datetime.date.today() - datetime.timedelta(days=3)).strftime('%Y-%m-%d')
+    calls = {'wpr': 0, 'render': 0}
+
+    async def fake_WPR_frame(stationCode, startTime, endTime, columns):
+        calls['wpr'] += 1
+        await asyncio.sleep(0.05)
+        return get_wpr_frame(date_str)
+
+    async def fake_AQ_datas(stationCodes, startTime, endTime):
+        await asyncio.sleep(0.05)
+        return [get_AQ_frame(date_str) for _ in stationCodes]
+
+    def fake_render(self, heatmap_data, site_datas, sitenames, use_en=True, format=None):
+        calls['render'] += 1
+        assert heatmap_data.horizontal_wind.OriginWS.shape[1] == 48
+        return b'image'
+
+    monkeypatch.setattr(wpr_main.api, 'async_get_WPR_frame', fake_WPR_frame)
+    monkeypatch.setattr(wpr_main.api, 'async_get_AQ_datas', fake_AQ_datas)
+    monkeypatch.setattr(wpr_main.Plotter, 'render', fake_render)
+
+    async def main():
+        app = FastAPI()
+        app.include_router(wpr_main.router, prefix='/WPR')
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await asyncio.gather(*[client.get('/WPR/Img', params={'date': date_str}) for _ in range(8)])
+
+    responses = asyncio.run(main())
+    assert [response.status_code for response in responses] == [200] * 8
+    assert all(response.content == b'image' for response in responses)
+    assert calls == {'wpr': 1, 'render': 1}
@@ -1,3 +1,4 @@
+import io
 import os
 import zipfile
 import time
@@ -6,6 +7,7 @@ from datetime import date, datetime, timedelta
 from enum import Enum
 from decimal import Decimal, ROUND_HALF_EVEN  # 四舍五入六成双
 import json
+import re
 from typing import Union
 
 
@@ -130,3 +132,49 @@ def concatenate_images_vertically(image_paths, output_path):
     # 保存拼接后的图片
     new_image.save(output_path)
     return output_path
+
+
+def image_to_bytes(image: Image.Image, format: str = "PNG", **params) -> bytes:
+    """将图片编码为字节，不写入文件
+
+    参数：
+    - image:图片
+    - format:图片格式
+    - params:编码参数，如JPEG、WebP的quality
+
+    返回：
+    编码后的图片内容
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def concatenate_svgs_vertically(svgs) -> bytes:
+    """将多张SVG图片竖向拼接成一张SVG图片，每张图作为嵌套的<svg>元素放在前一张图的下方
+
+    参数：
+    - svgs:各张图的SVG内容（bytes），根元素需有viewBox属性，如matplotlib导出的SVG
+
+    返回：
+    拼接后的SVG内容
+    """
+    panels = []
+    width = height = 0
+    for svg in svgs:
+        svg = svg.decode("utf-8") if isinstance(svg, bytes) else svg
+        svg = svg[svg.index("<svg"):]  # 去掉XML声明和DOCTYPE
+        root = svg[:svg.index(">") + 1]
+        _, _, w, h = [float(v) for v in re.search(r'viewBox="([^"]+)"', root).group(1).split()]
+        # 嵌套的图片以外层的viewBox为单位定位
+        new_root = re.sub(r'\s(width|height)="[^"]*"', "", root)
+        new_root = new_root.replace("<svg", f'<svg x="0" y="{height:g}" width="{w:g}" height="{h:g}"', 1)
+        panels.append(new_root + svg[len(root):])
+        width = max(width, w)
+        height += h
+    header = (
+        '<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+        f'<svg xmlns:xlink="http://www.w3.org/1999/xlink" width="{width:g}pt" height="{height:g}pt" '
+        f'viewBox="0 0 {width:g} {height:g}" xmlns="http://www.w3.org/2000/svg" version="1.1">\n'
+    )
+    return (header + "\n".join(panels) + "\n</svg>\n").encode("utf-8")
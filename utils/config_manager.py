@@ -21,6 +21,10 @@ class WebConfig():
     def api(self):
         return self.config['api']
     
+    @property
+    def wpr(self):
+        return self.config.get('wpr') or {}
+    
     @property
     def sqlite_db(self):
         return self.config['database']['sqlite']
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine,Engine
+from sqlalchemy import create_engine,Engine,event,pool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 import sys,os
 from contextlib import ExitStack
 from pathlib import Path
@@ -33,14 +34,75 @@ class Config():
     def url(self):
         return f"mssql+pymssql://{self._username}:{self._pwd}@{self._server}/{self._db}"
         
+# SQLite连接的默认配置，config.yml中database.sqlite.<数据库名>.pragmas的同名配置项会覆盖这些值，值为null时不设置
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL', # 写入时不阻塞读取，多个进程可以同时读写
+    'synchronous': 'NORMAL', # WAL模式下为NORMAL时断电只会丢失最后的事务，不会损坏数据库
+    'cache_size': -65536, # 每个连接的页缓存大小，负数表示KB
+    'mmap_size': 268435456, # 内存映射读取的大小（字节）
+    'busy_timeout': 30000, # 数据库被锁定时的等待时间（毫秒）
+}
+# SQLite连接池的默认配置，config.yml中database.sqlite.<数据库名>.pool的同名配置项会覆盖这些值
+DEFAULT_SQLITE_POOL = {
+    'pool_class': 'QueuePool', # 连接池类型，见sqlalchemy.pool，如QueuePool/NullPool/SingletonThreadPool
+    'pool_size': 10, # 保持的连接数
+    'max_overflow': 20, # 连接数超过pool_size时最多再创建的连接数
+    'pool_timeout': 30, # 获取连接的等待时间（秒）
+}
+QUEUE_POOL_ARGS = ['pool_size', 'max_overflow', 'pool_timeout'] # 只有QueuePool支持的参数
+
+def set_sqlite_pragmas(engine:Engine, pragmas:dict)->None:
+    ''' 每次创建新连接时执行PRAGMA语句 '''
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in pragmas.items():
+                if value is not None:
+                    cursor.execute(f'PRAGMA {key} = {value}')
+        finally:
+            cursor.close()
+
 def get_sqlite_engine(
     url:str,
     # encoding='utf-8',
     echo=True,
-    connect_args={'check_same_thread': False}
+    connect_args={'check_same_thread': False},
+    pragmas:dict|None=None,
+    pool_config:dict|None=None,
 ):
-    '''创建数据库引擎'''
-    engine = create_engine(url=url, echo=echo, connect_args=connect_args)
+    '''创建数据库引擎
+    :param pragmas:每个连接执行的PRAGMA，与DEFAULT_SQLITE_PRAGMAS合并
+    :param pool_config:连接池配置，与DEFAULT_SQLITE_POOL合并
+    '''
+    pragmas = {**DEFAULT_SQLITE_PRAGMAS, **(pragmas or {})}
+    engine = create_engine(url=url, echo=echo, connect_args=connect_args, **get_pool_args(pool_config))
+    set_sqlite_pragmas(engine, pragmas)
+    return engine
+
+def get_pool_args(pool_config:dict|None)->dict:
+    ''' 将连接池配置转换为create_engine的参数 '''
+    pool_config = {**DEFAULT_SQLITE_POOL, **(pool_config or {})}
+    poolclass = getattr(pool, pool_config.pop('pool_class'))
+    if not issubclass(poolclass, pool.QueuePool):
+        pool_config = {k:v for k,v in pool_config.items() if k not in QUEUE_POOL_ARGS}
+    return {'poolclass': poolclass, **pool_config}
+
+def get_async_sqlite_engine(
+    url:str,
+    echo=True,
+    pragmas:dict|None=None,
+)->AsyncEngine:
+    '''创建基于aiosqlite的异步数据库引擎，参数与get_sqlite_engine相同
+    aiosqlite的连接绑定创建它的事件循环并占用一个后台线程，不能放在连接池里跨事件循环复用，
+    因此固定使用NullPool：每次使用时新建连接，用完立即关闭，不需要在退出前调用dispose()
+    :param url:同步引擎的url（sqlite:///...），会转换为sqlite+aiosqlite:///...
+    '''
+    if url.startswith('sqlite:'):
+        url = 'sqlite+aiosqlite:' + url[len('sqlite:'):]
+    pragmas = {**DEFAULT_SQLITE_PRAGMAS, **(pragmas or {})}
+    engine = create_async_engine(url=url, echo=echo, poolclass=pool.NullPool)
+    set_sqlite_pragmas(engine.sync_engine, pragmas)
     return engine
 
 def get_engine_base(db_name:str, name:str='Base'):
@@ -68,6 +130,14 @@ def get_local_session(engine:Engine):
     '''
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=True)
     return SessionLocal    
+
+def get_async_local_session(engine:AsyncEngine):
+    '''
+    异步会话，用法：async with AsyncSessionLocal() as db
+    提交后不使实例过期，避免在事件循环中访问属性时隐式地查询数据库
+    '''
+    AsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
     
 def generate_orm_from_config(config:Config, outfile:Path, tables=None,mode='w'):
     generate_orm(config.url, outfile, tables)
@@ -0,0 +1,156 @@
+import os
+import time
+import struct
+import hashlib
+import threading
+
+class DiskCache():
+    ''' 磁盘缓存，写入为原子操作，超出容量时按最近访问时间（LRU）淘汰
+
+    参数：
+    - directory:缓存目录
+    - max_size_mb:缓存目录的最大容量（MB）
+    - max_age:缓存最长保留时间（秒），为None时不按时间淘汰
+    - suffix:缓存文件后缀
+    '''
+    HEADER = struct.Struct('<d') # 文件头：过期时间戳，0表示不过期
+
+    def __init__(self, directory:str, max_size_mb:float=1024, max_age:float|None=None, suffix:str='.bin'):
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._size = None # 缓存目录当前大小，首次写入时统计
+        self._lock = threading.Lock()
+        if not os.path.exists(directory):os.makedirs(directory)
+
+    @staticmethod
+    def hash_key(key:str)->str:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_path(self, key:str)->str:
+        ''' 获取缓存文件路径，按哈希值前两位分目录存放 '''
+        digest = self.hash_key(key)
+        return os.path.join(self.directory, digest[:2], f'{digest}{self.suffix}')
+
+    def _is_expired(self, path:str, expires_at:float, now:float)->bool:
+        if expires_at and expires_at < now:
+            return True
+        return self.max_age is not None and os.path.getmtime(path) + self.max_age < now
+
+    def get(self, key:str)->bytes|None:
+        ''' 读取缓存，不存在或已过期时返回None '''
+        path = self.get_path(key)
+        now = time.time()
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            expires_at, = self.HEADER.unpack_from(data)
+            if self._is_expired(path, expires_at, now):
+                with self._lock:
+                    self._remove(path)
+                self.misses += 1
+                return None
+            os.utime(path, (now, os.path.getmtime(path))) # 更新访问时间，用于LRU淘汰
+        except (FileNotFoundError, struct.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data[self.HEADER.size:]
+
+    def set(self, key:str, data:bytes, ttl:float|None=None)->str:
+        ''' 写入缓存
+        :param key:缓存键
+        :param data:缓存内容
+        :param ttl:有效时间（秒），为None时不过期
+        :return 缓存文件路径
+        '''
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        expires_at = time.time() + ttl if ttl is not None else 0
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(expires_at))
+            f.write(data)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path) # 原子替换，读取时不会读到写了一半的文件
+        self.writes += 1
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += self.HEADER.size + len(data) - old_size
+            if self._size > self.max_size:
+                self._evict()
+        return path
+
+    def _remove(self, path:str)->None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+    def _list_files(self)->list:
+        ''' :return list [(访问时间, 大小, 路径)] '''
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_atime, stat.st_size, path))
+        return files
+
+    def _scan_size(self)->int:
+        return sum(size for _, size, _ in self._list_files())
+
+    def _evict(self)->None:
+        ''' 先删除过期的缓存，再按访问时间从旧到新删除，直到容量降到上限的90%以下 '''
+        now = time.time()
+        files = sorted(self._list_files())
+        total = sum(size for _, size, _ in files)
+        remained = []
+        for item in files:
+            _, size, path = item
+            if self.max_age is not None and os.path.getmtime(path) + self.max_age < now:
+                self._unlink(path)
+                total -= size
+            else:
+                remained.append(item)
+        for _, size, path in remained:
+            if total <= self.max_size * 0.9:
+                break
+            self._unlink(path)
+            total -= size
+        self._size = total
+
+    def _unlink(self, path:str)->None:
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except FileNotFoundError:
+            pass
+
+    def stats(self)->dict:
+        ''' 缓存命中统计 '''
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'size': self._size,
+            'max_size': self.max_size,
+        }
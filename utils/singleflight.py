@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+
+class SingleFlight():
+    ''' 合并并发的相同请求：同一个key同时只执行一次，其余请求等待并共享执行结果（包括异常）
+
+    使用concurrent.futures.Future保存结果，因此不同线程、不同事件循环中的请求也能合并。
+    实际的执行放在独立的任务中，任何一个等待者（包括发起执行的请求）被取消（如客户端断开连接）都不影响执行和其他等待者
+    '''
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Set[asyncio.Task] = set() # 保持对执行任务的引用，避免任务被垃圾回收
+        self._lock = threading.Lock()
+        self.leaders = 0 # 实际执行的次数
+        self.followers = 0 # 等待共享结果的次数
+
+    def _join(self, key:Hashable, func:Callable[[], Awaitable[Any]])->Future:
+        ''' 加入正在执行的请求，没有时在当前事件循环中启动执行任务
+        :return Future 共享的执行结果
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.followers += 1
+                return future
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+        task = asyncio.get_running_loop().create_task(self._run(key, func, future))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return future
+
+    async def _run(self, key:Hashable, func:Callable[[], Awaitable[Any]], future:Future)->None:
+        ''' 执行func并把结果写入future，不向外抛出异常 '''
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # 执行任务本身被取消（如事件循环关闭），不把取消传递给其他事件循环中的等待者
+            if not future.done():
+                future.set_exception(RuntimeError('合并执行的请求已被取消'))
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._done(key, future)
+
+    def _done(self, key:Hashable, future:Future)->None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    async def do(self, key:Hashable, func:Callable[[], Awaitable[Any]]):
+        ''' 执行异步函数，相同key正在执行时等待其结果
+        :param key:请求的唯一标识
+        :param func:无参数的异步函数
+        '''
+        future = self._join(key, func)
+        # shield：等待者被取消时只取消自己的等待，不取消共享的future
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self)->dict:
+        return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': len(self._calls)}